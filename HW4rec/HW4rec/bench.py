@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the HW4 queries.
+
+Every query function is called on every backend (a module with the same
+API as program01) and for every database size. For each pair the
+benchmark reports:
+    - cold:  latency of the first call in ms (loading included; for sqlite
+             the SQLite file is deleted first, so the import of the json
+             tables is included too)
+    - warm:  average latency of the next calls in ms
+    - qps:   warm throughput in queries per second
+    - peak:  peak of the allocated memory in KiB (tracemalloc)
+
+The arguments of the queries are sampled from the database itself.
+Synthetic databases can be created with datagen.py, e.g.:
+    python datagen.py xl10 10
+    python bench.py small medium large xl10
+'''
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import program01
+import examdb
+import querycache
+import sqlitedb
+
+BACKENDS = {
+    'program01':  program01,
+    'examdb':     examdb,
+    'querycache': querycache,
+    'sqlite':     sqlitedb,
+}
+
+QUERIES = ('student_average', 'course_average', 'teacher_average', 'top_students',
+           'print_recorded_exams', 'print_top_students', 'print_exam_record')
+
+
+def sample_params(dbsize, n, seed=0):
+    ''' Returns, for each query, the list of "n" parameter tuples. '''
+    rnd = random.Random(seed)
+    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
+        exams = json.load(f)
+    with open(dbsize + '_courses.json', 'r', encoding='utf8') as f:
+        courses = json.load(f)
+    exams = rnd.choices(exams, k=n)
+    teachers = rnd.choices([c['teach_code'] for c in courses], k=n)
+    return {
+        'student_average':      [(e['stud_code'], dbsize) for e in exams],
+        'course_average':       [(e['course_code'], dbsize) for e in exams],
+        'teacher_average':      [(t, dbsize) for t in teachers],
+        'top_students':         [(dbsize,)] * n,
+        'print_recorded_exams': [(e['stud_code'], dbsize) for e in exams],
+        'print_top_students':   [(dbsize,)] * n,
+        'print_exam_record':    [(e['exam_code'], dbsize) for e in exams],
+    }
+
+
+def reset(backend, dbsize):
+    ''' Forgets the data loaded by the backend, so that the first call is cold. '''
+    if backend is sqlitedb:
+        # closes the connections and drops the imported file
+        sqlitedb.close()
+        if os.path.exists(dbsize + '.sqlite'):
+            os.remove(dbsize + '.sqlite')
+    if hasattr(backend, 'databases'):
+        backend.databases.clear()
+    if hasattr(backend, 'cache'):
+        backend.cache.clear()
+        backend.cache.attached.clear()
+        examdb.databases.clear()
+
+
+def run(backend, query, params, fileout, dbsize):
+    ''' Times the calls of "query" on "backend". Returns a dict of results. '''
+    func = getattr(backend, query)
+    if query.startswith('print_'):
+        params = [p + (fileout,) for p in params]
+    reset(backend, dbsize)
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*params[0])
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for p in params[1:]:
+        func(*p)
+    warm = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = max(1, len(params) - 1)
+    return {'cold': cold * 1000, 'warm': warm * 1000 / calls,
+            'qps': calls / warm if warm else float('inf'), 'peak': peak / 1024}
+
+
+def benchmark(dbsizes, backends=None, queries=QUERIES, n=20):
+    ''' Returns a list of (dbsize, backend, query, results) rows. '''
+    backends = backends or list(BACKENDS)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        fileout = os.path.join(tmp, 'bench.txt')
+        for dbsize in dbsizes:
+            params = sample_params(dbsize, n)
+            for name in backends:
+                for query in queries:
+                    if hasattr(BACKENDS[name], query):
+                        rows.append((dbsize, name, query, run(BACKENDS[name], query, params[query], fileout, dbsize)))
+    return rows
+
+
+def report(rows):
+    print(f"{'dbsize':<8}{'backend':<12}{'query':<22}{'cold ms':>10}{'warm ms':>10}{'qps':>12}{'peak KiB':>11}")
+    for dbsize, backend, query, r in rows:
+        print(f"{dbsize:<8}{backend:<12}{query:<22}{r['cold']:>10.2f}{r['warm']:>10.3f}{r['qps']:>12.0f}{r['peak']:>11.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('dbsize', nargs='*', default=['small', 'medium', 'large'])
+    parser.add_argument('-b', '--backend', action='append', choices=list(BACKENDS))
+    parser.add_argument('-q', '--query', action='append', choices=QUERIES)
+    parser.add_argument('-n', '--calls', type=int, default=20, help='calls per query')
+    parser.add_argument('--json', help='also save the results in this file')
+    args = parser.parse_args()
+    rows = benchmark(args.dbsize, args.backend, args.query or QUERIES, args.calls)
+    report(rows)
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as f:
+            json.dump([{'dbsize': d, 'backend': b, 'query': q, **r} for d, b, q, r in rows], f, indent=1)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Generator of synthetic HW4 databases.
+
+The names, surnames and course names are drawn from nomi.json,
+cognomi.json and tutti_corsi.json, the sizes of the tables are the ones of
+the large database multiplied by "scale" (10, 100, 1000, ...).
+The four tables are saved as <dbsize>_students.json, <dbsize>_courses.json,
+<dbsize>_exams.json and <dbsize>_teachers.json, so that every HW4 function
+can be called with the new dbsize.
+
+Usage:
+    python datagen.py xl10 10
+'''
+import json
+import random
+import sys
+
+# size of the tables of the large database, with scale = 1
+STUDENTS = 500
+TEACHERS = 100
+COURSES = 180
+EXAMS_PER_STUDENT = 10
+YEARS = range(2017, 2022)
+
+
+def load_pools():
+    ''' Returns the lists of names, surnames and course names. '''
+    with open('nomi.json', 'r', encoding='utf8') as f:
+        names = sorted({n['name'].title() for n in json.load(f)})
+    with open('cognomi.json', 'r', encoding='utf8') as f:
+        surnames = json.load(f)
+    with open('tutti_corsi.json', 'r', encoding='utf8') as f:
+        course_names = sorted(set(json.load(f)))
+    return names, surnames, course_names
+
+
+def initials(text):
+    return ''.join(w[0] for w in text.split() if w[0].isalpha()).upper()
+
+
+def generate(dbsize, scale, seed=0):
+    ''' Returns the four tables (students, courses, exams, teachers) of a
+        synthetic database "scale" times larger than the large one. '''
+    rnd = random.Random(seed)
+    names, surnames, course_names = load_pools()
+    n_teachers, n_courses = TEACHERS * scale, COURSES * scale
+    n_students = STUDENTS * scale
+    digits = max(5, len(str(n_teachers)) + 1)
+    domain = dbsize + '.it'
+
+    teachers = []
+    for i in range(n_teachers):
+        surname = rnd.choice(surnames)
+        teachers.append({'teach_code': str(i).zfill(digits),
+                         'teach_name': rnd.choice(names),
+                         'teach_surname': surname,
+                         'teach_email': f"{surname.lower().replace(' ', '')}@{domain}"})
+
+    courses = []
+    hexcodes = rnd.sample(range(0x100000, 0x1000000), n_courses)
+    for i in range(n_courses):
+        name = rnd.choice(course_names)
+        courses.append({'course_code': f"{initials(name)}{hex(hexcodes[i])}",
+                        'course_name': name,
+                        'teach_code': teachers[rnd.randrange(n_teachers)]['teach_code']})
+
+    students = []
+    first = 10 ** (len(str(n_students)) + 1) if n_students > 800000 else 1200000
+    codes = rnd.sample(range(first, 2 * first), n_students)
+    for code in codes:
+        name, surname = rnd.choice(names), rnd.choice(surnames)
+        students.append({'stud_code': str(code),
+                         'stud_name': name,
+                         'stud_surname': surname,
+                         'stud_email': f"{code}_{name[0].lower()}{surname[0].lower()}@{domain}"})
+
+    exams = []
+    exam_code = 1
+    for student in students:
+        for course in rnd.sample(courses, min(n_courses, rnd.randint(1, 2 * EXAMS_PER_STUDENT - 1))):
+            exams.append({'exam_code': exam_code,
+                          'course_code': course['course_code'],
+                          'stud_code': student['stud_code'],
+                          'date': f"{rnd.choice(YEARS)}/{rnd.randint(1, 12):02}/{rnd.randint(1, 28):02}",
+                          'grade': rnd.randint(18, 30)})
+            exam_code += 1
+    return students, courses, exams, teachers
+
+
+def save(dbsize, tables):
+    for table, rows in zip(('students', 'courses', 'exams', 'teachers'), tables):
+        with open(dbsize + '_' + table + '.json', 'w', encoding='utf8') as f:
+            json.dump(rows, f, indent=1, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    dbsize, scale = sys.argv[1], int(sys.argv[2])
+    save(dbsize, generate(dbsize, scale))
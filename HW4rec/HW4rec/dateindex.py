@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Date index of the HW4 exams.
+
+The exam dates 'YYYY/MM/DD' are packed in the integer YYYYMMDD, that keeps
+the same order. For every student, course and teacher the index keeps the
+sorted packed dates of their exams together with the prefix sums of the
+grades, so the average of the exams between two dates is found with two
+binary searches, in O(log n):
+
+    index = DateIndex(examdb.open_db('large'))
+    index.average_between('course', 'MASP0x6f69a0', '2018/01/01', '2019/12/31')
+
+The bounds are included and can be either strings or packed dates.
+When exams are added to the ExamDB, only the keys of the touched students,
+courses and teachers are rebuilt, the first time they are queried.
+'''
+from bisect import bisect_left, bisect_right
+
+import examdb
+
+KINDS = ('student', 'course', 'teacher')
+
+
+def pack_date(date):
+    ''' 'YYYY/MM/DD' -> YYYYMMDD (integers are returned unchanged). '''
+    if isinstance(date, int):
+        return date
+    return int(date[:4]) * 10000 + int(date[5:7]) * 100 + int(date[8:10])
+
+
+def unpack_date(packed):
+    ''' YYYYMMDD -> 'YYYY/MM/DD' '''
+    return f"{packed // 10000:04}/{packed // 100 % 100:02}/{packed % 100:02}"
+
+
+def build_key(exams):
+    ''' Returns (dates, sums) for the "exams": the sorted packed dates and
+        the prefix sums of the grades (sums[i] = total of the first i exams). '''
+    pairs = sorted((pack_date(e['date']), e['grade']) for e in exams)
+    dates = [d for d, _ in pairs]
+    sums = [0]
+    for _, grade in pairs:
+        sums.append(sums[-1] + grade)
+    return dates, sums
+
+
+class DateIndex:
+
+    def __init__(self, db):
+        self.db = db
+        self.keys = {}          # (kind, code) -> (dates, sums)
+        self.dirty = set()      # keys to rebuild before using them
+        for kind in KINDS:
+            for code in self.codes(kind):
+                self.keys[kind, code] = build_key(self.exams_of(kind, code))
+        db.listeners.append(self.invalidate)
+
+    def codes(self, kind):
+        if kind == 'student':
+            return self.db.exams_by_student
+        if kind == 'course':
+            return self.db.exams_by_course
+        return self.db.courses_by_teacher
+
+    def exams_of(self, kind, code):
+        if kind == 'teacher':
+            return [e for course_code in self.db.courses_by_teacher.get(code, ())
+                    for e in self.db.exams_by_course.get(course_code, ())]
+        return self.codes(kind).get(code, ())
+
+    def invalidate(self, db, tags):
+        ''' ExamDB listener: the touched keys are rebuilt lazily. '''
+        if tags is None:
+            self.keys.clear()
+            self.dirty.clear()
+            for kind in KINDS:
+                self.dirty.update((kind, code) for code in self.codes(kind))
+        else:
+            self.dirty.update(tags)
+
+    def key(self, kind, code):
+        if (kind, code) in self.dirty:
+            self.dirty.discard((kind, code))
+            self.keys[kind, code] = build_key(self.exams_of(kind, code))
+        return self.keys.get((kind, code), ((), (0,)))
+
+    def totals_between(self, kind, code, start, end):
+        ''' Returns (sum of grades, number of exams) of the exams of the
+            student/course/teacher "code" with start <= date <= end. '''
+        dates, sums = self.key(kind, code)
+        i = bisect_left(dates, pack_date(start))
+        j = bisect_right(dates, pack_date(end))
+        if j <= i:
+            return 0, 0
+        return sums[j] - sums[i], j - i
+
+    def average_between(self, kind, code, start, end):
+        return examdb.average(*self.totals_between(kind, code, start, end))
+
+
+# date indexes already built, by dbsize
+indexes = {}
+
+
+def open_index(dbsize):
+    index = indexes.get(dbsize)
+    if index is None:
+        index = indexes[dbsize] = DateIndex(examdb.open_db(dbsize))
+    return index
+
+
+def student_average_between(stud_code, start, end, dbsize):
+    return open_index(dbsize).average_between('student', stud_code, start, end)
+
+
+def course_average_between(course_code, start, end, dbsize):
+    return open_index(dbsize).average_between('course', course_code, start, end)
+
+
+def teacher_average_between(teach_code, start, end, dbsize):
+    return open_index(dbsize).average_between('teacher', teach_code, start, end)
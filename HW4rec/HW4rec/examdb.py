@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+In-memory version of the HW4 exam database.
+
+The four tables of a database of size dbsize are loaded once from the
+files <dbsize>_students.json, <dbsize>_courses.json, <dbsize>_exams.json
+and <dbsize>_teachers.json and indexed by student, course and teacher.
+The grade totals of every student and course are kept up to date, so the
+averages do not need to scan the exams table again.
+
+An ExamDB answers the same queries as program01 (same rounding, same
+output files), without the dbsize parameter.
+New exams can be added with add_exams: the indexes are updated in place
+and the registered listeners are told which students, courses and
+teachers have been touched, e.g. to invalidate cached results.
+
+open_db interns the codes and names of the four tables in one StringPool
+(see strpool), so equal codes are shared by all the tables.
+'''
+import itertools
+
+import report
+from querystats import instrumented, phase, count
+from strpool import StringPool
+from tables import TABLES, load_table, average
+
+# versions of the datasets, never shared by two ExamDB objects
+_versions = itertools.count(1)
+
+
+class ExamDB:
+
+    def __init__(self, students, courses, exams, teachers, dbsize=None, pool=None):
+        self.dbsize = dbsize
+        # StringPool shared by the tables (None if the strings are not interned)
+        self.pool = pool
+        # changed each time the whole dataset is reloaded (see refresh)
+        self.version = next(_versions)
+        # callables listener(db, tags) notified when the data change
+        self.listeners = []
+        with phase('index'):
+            self._build(students, courses, exams, teachers)
+
+    @classmethod
+    def load(cls, dbsize, pool=None):
+        ''' Loads the database of size "dbsize" from its json files,
+            interning the codes and names in "pool" (if given). '''
+        return cls(*(load_table(dbsize, table, pool) for table in TABLES), dbsize=dbsize, pool=pool)
+
+    def _build(self, students, courses, exams, teachers):
+        # primary keys (the first row wins, as in the linear searches of program01)
+        self.students = {}
+        for s in students:
+            self.students.setdefault(s['stud_code'], s)
+        self.courses = {}
+        for c in courses:
+            self.courses.setdefault(c['course_code'], c)
+        self.teachers = {}
+        for t in teachers:
+            self.teachers.setdefault(t['teach_code'], t)
+        # teacher -> list of course codes
+        self.courses_by_teacher = {}
+        for c in courses:
+            self.courses_by_teacher.setdefault(c['teach_code'], []).append(c['course_code'])
+        self.exams = []
+        self.exam_by_code = {}
+        self.exams_by_student = {}
+        self.exams_by_course = {}
+        # code -> [sum of grades, number of exams]
+        self.student_totals = {}
+        self.course_totals = {}
+        self._index(exams)
+
+    def _index(self, exams):
+        for e in exams:
+            self.exams.append(e)
+            self.exam_by_code.setdefault(e['exam_code'], e)
+            self.exams_by_student.setdefault(e['stud_code'], []).append(e)
+            self.exams_by_course.setdefault(e['course_code'], []).append(e)
+            totals = self.student_totals.setdefault(e['stud_code'], [0, 0])
+            totals[0] += e['grade']
+            totals[1] += 1
+            totals = self.course_totals.setdefault(e['course_code'], [0, 0])
+            totals[0] += e['grade']
+            totals[1] += 1
+
+    def _notify(self, tags):
+        for listener in self.listeners:
+            listener(self, tags)
+
+    def touched(self, exams):
+        ''' Returns the set of tags of the entities touched by the "exams":
+            ('student', stud_code), ('course', course_code) and
+            ('teacher', teach_code). '''
+        tags = set()
+        for e in exams:
+            tags.add(('student', e['stud_code']))
+            tags.add(('course', e['course_code']))
+            course = self.courses.get(e['course_code'])
+            if course is not None:
+                tags.add(('teacher', course['teach_code']))
+        return tags
+
+    def add_exams(self, exams):
+        ''' Appends the "exams" records to the exams table, updating the
+            indexes incrementally. Returns the set of touched tags. '''
+        if self.pool is not None:
+            exams = [self.pool.intern_row(e) for e in exams]
+        else:
+            exams = list(exams)
+        with phase('index'):
+            self._index(exams)
+        tags = self.touched(exams)
+        self._notify(tags)
+        return tags
+
+    def refresh(self):
+        ''' Reloads the whole dataset from its json files.
+            All the listeners are notified with tags=None. '''
+        if self.pool is not None:
+            self.pool = StringPool(self.pool.fields)
+        tables = [load_table(self.dbsize, table, self.pool) for table in TABLES]
+        with phase('index'):
+            self._build(*tables)
+        self.version = next(_versions)
+        self._notify(None)
+
+    ############# QUERIES ###########
+    def lookup(self, index, key, default=(0, 0)):
+        ''' index[key], counting the hits and misses of the indexes. '''
+        value = index.get(key)
+        if value is None:
+            count('index_misses')
+            return default
+        count('index_hits')
+        return value
+
+    def student_average(self, stud_code):
+        return average(*self.lookup(self.student_totals, stud_code))
+
+    def course_average(self, course_code):
+        return average(*self.lookup(self.course_totals, course_code))
+
+    def teacher_average(self, teach_code):
+        total = n = 0
+        for course_code in self.lookup(self.courses_by_teacher, teach_code, ()):
+            t, c = self.lookup(self.course_totals, course_code)
+            total += t
+            n += c
+        return average(total, n)
+
+    def teacher_averages(self):
+        ''' Dict teach_code -> average of every teacher, in one sweep on the
+            grade totals of the courses. '''
+        totals = {code: [0, 0] for code in self.teachers}
+        for teach_code, course_codes in self.courses_by_teacher.items():
+            total = totals.setdefault(teach_code, [0, 0])
+            for course_code in course_codes:
+                t, c = self.course_totals.get(course_code, (0, 0))
+                total[0] += t
+                total[1] += c
+        return {code: average(*total) for code, total in totals.items()}
+
+    def student_name(self, stud_code):
+        student = self.students[stud_code]
+        return f"{student['stud_surname']} {student['stud_name']}"
+
+    def top_averages(self, threshold=28):
+        ''' Returns (rows, width): the list of (stud_code, average, full name)
+            of the students with an average >= threshold, sorted as in
+            top_students, and the length of the longest name. '''
+        rows = []
+        width = 0
+        with phase('filter'):
+            count('rows_scanned', len(self.student_totals))
+            for stud_code, (total, n) in self.student_totals.items():
+                if stud_code in self.students:
+                    avg = average(total, n)
+                    if avg >= threshold:
+                        name = self.student_name(stud_code)
+                        rows.append((stud_code, avg, name))
+                        width = max(width, len(name))
+        with phase('sort'):
+            rows.sort(key=lambda x: (-x[1], x[2], x[0]))
+        return rows, width
+
+    def top_students(self):
+        return [code for code, _, _ in self.top_averages()[0]]
+
+    def print_recorded_exams(self, stud_code, fileout):
+        if self.lookup(self.students, stud_code, None) is None:
+            return  # Student not found
+        exams = self.lookup(self.exams_by_student, stud_code, ())
+        names = {}
+        for e in exams:
+            names[e['course_code']] = self.courses[e['course_code']]['course_name']
+        with phase('sort'):
+            exams = sorted(exams, key=lambda e: (e['date'], names[e['course_code']]))
+        width = max((len(name) for name in names.values()), default=0)
+        with phase('write'):
+            lines = [f"Exams taken by student {self.student_name(stud_code)}, student number {stud_code}\n"]
+            for e in exams:
+                lines.append(f"{names[e['course_code']]:<{width}}\t{e['date']}\t{e['grade']}\n")
+            with open(fileout, 'w', encoding='utf8') as f:
+                f.write(''.join(lines))
+        return len(exams)
+
+    def print_top_students(self, fileout):
+        rows, width = self.top_averages()
+        with phase('write'):
+            return report.write_top_students(rows, fileout, width)
+
+    def print_top_reports(self, reports):
+        ''' Writes a report for each fileout -> threshold of "reports". '''
+        rows, _ = self.top_averages(min(reports.values(), default=28))
+        with phase('write'):
+            return report.write_top_reports(rows, reports)
+
+    def print_exam_record(self, exam_code, fileout):
+        exam = self.exam_by_code[exam_code]
+        student = self.students[exam['stud_code']]
+        course = self.courses[exam['course_code']]
+        teacher = self.teachers[course['teach_code']]
+        count('index_hits', 4)
+        with phase('write'), open(fileout, 'w', encoding='utf8') as f:
+            f.write('The student {} {}, student number {}, took on {} the {} exam with the teacher {} {} with grade {}.'.format(
+                student['stud_name'], student['stud_surname'], exam['stud_code'], exam['date'],
+                course['course_name'], teacher['teach_name'], teacher['teach_surname'], exam['grade']))
+        return exam['grade']
+
+
+# databases already loaded, by dbsize
+databases = {}
+
+
+def open_db(dbsize):
+    ''' Returns the ExamDB of size "dbsize", loading it the first time. '''
+    db = databases.get(dbsize)
+    if db is None:
+        db = databases[dbsize] = ExamDB.load(dbsize, StringPool())
+    return db
+
+
+############# SAME API AS PROGRAM01 ###########
+@instrumented
+def student_average(stud_code, dbsize):
+    return open_db(dbsize).student_average(stud_code)
+
+
+@instrumented
+def course_average(course_code, dbsize):
+    return open_db(dbsize).course_average(course_code)
+
+
+@instrumented
+def teacher_average(teach_code, dbsize):
+    return open_db(dbsize).teacher_average(teach_code)
+
+
+@instrumented
+def teacher_averages(dbsize):
+    return open_db(dbsize).teacher_averages()
+
+
+@instrumented
+def top_students(dbsize):
+    return open_db(dbsize).top_students()
+
+
+@instrumented
+def print_recorded_exams(stud_code, dbsize, fileout):
+    return open_db(dbsize).print_recorded_exams(stud_code, fileout)
+
+
+@instrumented
+def print_top_students(dbsize, fileout):
+    return open_db(dbsize).print_top_students(fileout)
+
+
+@instrumented
+def print_top_reports(dbsize, reports):
+    return open_db(dbsize).print_top_reports(reports)
+
+
+@instrumented
+def print_exam_record(exam_code, dbsize, fileout):
+    return open_db(dbsize).print_exam_record(exam_code, fileout)
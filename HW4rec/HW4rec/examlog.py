@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Append-only journal of the new HW4 exams.
+
+The exams table <dbsize>_exams.json is a snapshot: the new exams are not
+written in it, but appended (one json object per line) to the journal
+<dbsize>_exams.log next to it, and added to the in-memory ExamDB with
+add_exams. The indexes and grade totals of the ExamDB are updated
+incrementally, and the results cached by its listeners (query cache,
+date index) are invalidated only for the touched students, courses and
+teachers, so the queries see the new exams without reloading anything.
+
+The exams appended must have all the FIELDS and a new exam_code: the
+others are rejected (ValueError) and never reach the journal. When the
+ExamLog is opened the exams of the journal are added to the database,
+skipping (with the same rule) the ones already in it. compact() writes all the exams back into the snapshot and
+empties the journal; it is called automatically every "compact_every"
+appended exams (never, if compact_every is None).
+'''
+import json
+import os
+
+import examdb
+
+FIELDS = ('exam_code', 'course_code', 'stud_code', 'date', 'grade')
+
+
+class ExamLog:
+
+    def __init__(self, db, path=None, compact_every=10000):
+        self.db = db
+        self.snapshot = db.dbsize + '_exams.json'
+        self.path = path or db.dbsize + '_exams.log'
+        self.compact_every = compact_every
+        self.pending = self.replay()
+
+    def replay(self):
+        ''' Adds to the database the exams of the journal that are not in
+            the snapshot yet. Returns the number of exams in the journal. '''
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'r', encoding='utf8') as f:
+            exams = [json.loads(line) for line in f if line.strip()]
+        # an interrupted compaction could have saved them in the snapshot already
+        self.db.add_exams([e for e in exams if e['exam_code'] not in self.db.exam_by_code])
+        return len(exams)
+
+    def check(self, exams):
+        ''' Raises ValueError if an exam misses some FIELDS or has an
+            exam_code already in the database (or twice in "exams"). '''
+        codes = set()
+        for e in exams:
+            missing = [field for field in FIELDS if field not in e]
+            if missing:
+                raise ValueError(f"exam without {', '.join(missing)}: {e!r}")
+            if e['exam_code'] in self.db.exam_by_code or e['exam_code'] in codes:
+                raise ValueError(f"duplicated exam_code {e['exam_code']!r}")
+            codes.add(e['exam_code'])
+
+    def append(self, exams):
+        ''' Adds the "exams" to the database and then to the journal.
+            Returns the set of tags touched (see ExamDB.add_exams). '''
+        exams = list(exams)
+        self.check(exams)
+        tags = self.db.add_exams(exams)
+        with open(self.path, 'a', encoding='utf8') as f:
+            f.write(''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in exams))
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending += len(exams)
+        if self.compact_every is not None and self.pending >= self.compact_every:
+            self.compact()
+        return tags
+
+    def compact(self):
+        ''' Writes all the exams into the snapshot and empties the journal. '''
+        tmp = self.snapshot + '.tmp'
+        with open(tmp, 'w', encoding='utf8') as f:
+            json.dump(self.db.exams, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.snapshot)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.pending = 0
+
+    def reload(self):
+        ''' Reloads the snapshot and replays the journal. '''
+        self.db.refresh()
+        self.pending = self.replay()
+
+
+# journals already open, by dbsize
+logs = {}
+
+
+def open_log(dbsize, compact_every=10000):
+    ''' Returns the journal of the database "dbsize" (see examdb.open_db). '''
+    log = logs.get(dbsize)
+    if log is None:
+        log = logs[dbsize] = ExamLog(examdb.open_db(dbsize), compact_every=compact_every)
+    return log
+
+
+def add_exam(exam, dbsize):
+    ''' Records a new exam of the database "dbsize". '''
+    return open_log(dbsize).append([exam])
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Concurrent loader of the HW4 databases.
+
+The files <dbsize>_students.json, <dbsize>_courses.json,
+<dbsize>_exams.json and <dbsize>_teachers.json of all the requested
+database sizes are read and parsed in parallel by a pool of threads (or of
+processes, with processes=True). As soon as the four tables of a database
+are ready, its ExamDB is built and indexed, while the other files are
+still being parsed.
+
+The json parser holds the GIL: the threads give no speedup, only the reads
+of the files overlap and the total time is about the one of a serial load.
+Only with processes=True the files are really parsed in parallel, at the
+cost of starting the processes and of sending the parsed rows back.
+The strings are not interned in a StringPool, that cannot be shared by
+parsers running at the same time.
+
+load_all returns the dict dbsize -> ExamDB and the time spent on every file
+(the CPU time of its thread, reading and parsing, without the waits for the
+GIL), on the indexing of every database and in total:
+
+    python loader.py small medium large
+'''
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import examdb
+from examdb import TABLES, ExamDB
+
+SIZES = ('small', 'medium', 'large')
+
+
+def timed_load(dbsize, table):
+    ''' Loads a table, returns it with the CPU seconds of the thread: the
+        time spent waiting for the other threads is not counted. '''
+    start = time.thread_time()
+    rows = examdb.load_table(dbsize, table)
+    return rows, time.thread_time() - start
+
+
+def load_all(dbsizes=SIZES, workers=None, processes=False):
+    ''' Loads the databases "dbsizes" concurrently.
+        Returns (databases, timings): the dict dbsize -> ExamDB and the dict
+        name -> seconds, with an entry for each json file, one for the
+        indexing of each database ('<dbsize> index') and the 'total'. '''
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    databases, timings = {}, {}
+    tables = {dbsize: {} for dbsize in dbsizes}
+    with executor(max_workers=workers or len(dbsizes) * len(TABLES)) as pool:
+        futures = {pool.submit(timed_load, dbsize, table): (dbsize, table)
+                   for dbsize in dbsizes for table in TABLES}
+        for future in as_completed(futures):
+            dbsize, table = futures[future]
+            rows, seconds = future.result()
+            timings[dbsize + '_' + table + '.json'] = seconds
+            tables[dbsize][table] = rows
+            if len(tables[dbsize]) == len(TABLES):
+                indexing = time.perf_counter()
+                databases[dbsize] = ExamDB(*(tables[dbsize][t] for t in TABLES), dbsize=dbsize)
+                timings[dbsize + ' index'] = time.perf_counter() - indexing
+                del tables[dbsize]
+    timings['total'] = time.perf_counter() - start
+    return databases, timings
+
+
+def preload(dbsizes=SIZES, workers=None, processes=False):
+    ''' Loads the databases concurrently and makes examdb.open_db (and so
+        all the examdb functions) use them. The databases already open are
+        kept: their listeners (caches, journals, indexes) stay attached and
+        their added exams are not lost. Returns the timings. '''
+    missing = [dbsize for dbsize in dbsizes if dbsize not in examdb.databases]
+    if not missing:
+        return {'total': 0.0}
+    databases, timings = load_all(missing, workers, processes)
+    examdb.databases.update(databases)
+    return timings
+
+
+if __name__ == '__main__':
+    _, timings = load_all(sys.argv[1:] or SIZES)
+    for name, seconds in timings.items():
+        print(f"{name:<24}{seconds * 1000:>10.1f} ms")
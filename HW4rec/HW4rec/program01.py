@@ -1,11 +1,16 @@
-import json
+import report
+from querystats import instrumented, phase, count
+from tables import load_table, average
 
+
+@instrumented
 def student_average(stud_code, dbsize):
     # open the file
-    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
-        exams = json.load(f)
+    exams = load_table(dbsize, 'exams')
     # filter the exams of the student
-    exams = [e for e in exams if e['stud_code'] == stud_code]
+    with phase('filter'):
+        count('rows_scanned', len(exams))
+        exams = [e for e in exams if e['stud_code'] == stud_code]
     # compute the average
     if len(exams) == 0:
         return 0
@@ -13,12 +18,15 @@ def student_average(stud_code, dbsize):
         return round(sum(e['grade'] for e in exams) / len(exams), 2)
     pass
 
+
+@instrumented
 def course_average(course_code, dbsize):
     # open the file
-    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
-        exams = json.load(f)
+    exams = load_table(dbsize, 'exams')
     # filter the exams of the course
-    exams = [e for e in exams if e['course_code'] == course_code]
+    with phase('filter'):
+        count('rows_scanned', len(exams))
+        exams = [e for e in exams if e['course_code'] == course_code]
 # compute the average
     if len(exams) == 0:
         return 0
@@ -28,72 +36,123 @@ def course_average(course_code, dbsize):
 
     pass
 
+
+@instrumented
 def teacher_average(teach_code, dbsize):
     # Load exams data
-    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
-        exams = json.load(f)
+    exams = load_table(dbsize, 'exams')
     # Load courses data
-    with open(dbsize + '_courses.json', 'r', encoding='utf8') as f:
-        courses = json.load(f)
+    courses = load_table(dbsize, 'courses')
 
-    # Filter courses taught by the teacher
-    teacher_courses = [course['course_code'] for course in courses if course['teach_code'] == teach_code]
-    # Filter exams for these courses
-    teacher_exams = [exam for exam in exams if exam['course_code'] in teacher_courses]
+    with phase('filter'):
+        count('rows_scanned', len(courses) + len(exams))
+        # Filter courses taught by the teacher (a set, for constant time lookups)
+        teacher_courses = {course['course_code'] for course in courses if course['teach_code'] == teach_code}
+        # Filter exams for these courses (all the exams are still scanned,
+        # only examdb visits just the exams of the teacher's courses)
+        teacher_exams = [exam for exam in exams if exam['course_code'] in teacher_courses]
 
     # Compute the average
-    if len(teacher_exams) == 0:
-        return 0
-    else:
-        return round(sum(e['grade'] for e in teacher_exams) / len(teacher_exams), 2)
+    return average(sum(e['grade'] for e in teacher_exams), len(teacher_exams))
 
 
-def top_students(dbsize):
+@instrumented
+def teacher_averages(dbsize):
+    # Load the necessary data
+    teachers = load_table(dbsize, 'teachers')
+    courses = load_table(dbsize, 'courses')
+    exams = load_table(dbsize, 'exams')
+
+    with phase('filter'):
+        count('rows_scanned', len(courses) + len(exams))
+        # Teachers of every course
+        course_teachers = {}
+        for course in courses:
+            course_teachers.setdefault(course['course_code'], set()).add(course['teach_code'])
+
+        # Sum and count the grades of every teacher with a single pass on the exams
+        totals = {teacher['teach_code']: [0, 0] for teacher in teachers}
+        for e in exams:
+            for teach_code in course_teachers.get(e['course_code'], ()):
+                total = totals.setdefault(teach_code, [0, 0])
+                total[0] += e['grade']
+                total[1] += 1
+
+    # Compute the average of every teacher
+    return {code: average(total, n) for code, (total, n) in totals.items()}
+
+
+def top_averages(dbsize, threshold=28):
+    # Returns the sorted (stud_code, average, name) rows of the students with
+    # average >= threshold, and the length of the longest name
     # Load students data
-    with open(dbsize + '_students.json', 'r', encoding='utf8') as f:
-        students = json.load(f)
+    students = load_table(dbsize, 'students')
     # Load exams data
-    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
-        exams = json.load(f)
-
-    student_averages = {}
-    for student in students:
-        student_exams = [e for e in exams if e['stud_code'] == student['stud_code']]
-        if student_exams:
-            average = round(sum(e['grade'] for e in student_exams) / len(student_exams), 2)
-            if average >= 28:
-                # Include both the average and the student's full name for sorting
-                student_averages[student['stud_code']] = (average, f"{student['stud_surname']} {student['stud_name']}")
+    exams = load_table(dbsize, 'exams')
+
+    with phase('filter'):
+        count('rows_scanned', len(exams) + len(students))
+        # Sum and count the grades of every student with a single pass on the exams
+        totals = {}
+        for e in exams:
+            total = totals.get(e['stud_code'])
+            if total is None:
+                totals[e['stud_code']] = [e['grade'], 1]
+            else:
+                total[0] += e['grade']
+                total[1] += 1
+
+        # Keep the length of the longest name, to pad the reports
+        student_averages = {}
+        width = 0
+        for student in students:
+            total = totals.get(student['stud_code'])
+            if total:
+                average = round(total[0] / total[1], 2)
+                if average >= threshold:
+                    # Include both the average and the student's full name for sorting
+                    name = f"{student['stud_surname']} {student['stud_name']}"
+                    student_averages[student['stud_code']] = (average, name)
+                    width = max(width, len(name))
 
     # Sort by average grade in descending order and then by name in case of a tie
-    sorted_students = sorted_students = sorted(student_averages.items(), key=lambda x: (-x[1][0], x[1][1], x[0]))
+    with phase('sort'):
+        sorted_students = sorted(student_averages.items(), key=lambda x: (-x[1][0], x[1][1], x[0]))
+
+    return [(code, average, name) for code, (average, name) in sorted_students], width
+
 
-    return [code for code, _ in sorted_students]
+@instrumented
+def top_students(dbsize):
+    return [code for code, _, _ in top_averages(dbsize)[0]]
 
 
+@instrumented
 def print_recorded_exams(stud_code, dbsize, fileout):
     # Load the necessary data
-    with open(dbsize + '_students.json', 'r', encoding='utf8') as f:
-        students = json.load(f)
-    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
-        exams = json.load(f)
-    with open(dbsize + '_courses.json', 'r', encoding='utf8') as f:
-        courses = json.load(f)
+    students = load_table(dbsize, 'students')
+    exams = load_table(dbsize, 'exams')
+    courses = load_table(dbsize, 'courses')
 
     # Find the student
-    student = next((s for s in students if s['stud_code'] == stud_code), None)
-    if not student:
-        return  # Student not found
+    with phase('filter'):
+        count('rows_scanned', len(students) + len(exams))
+        student = next((s for s in students if s['stud_code'] == stud_code), None)
+        if not student:
+            return  # Student not found
+
+        # Filter exams taken by the student
+        student_exams = [exam for exam in exams if exam['stud_code'] == stud_code]
 
-    # Filter exams taken by the student and sort
-    student_exams = [exam for exam in exams if exam['stud_code'] == stud_code]
-    student_exams.sort(key=lambda x: (x['date'], next(c['course_name'] for c in courses if c['course_code'] == x['course_code'])))
+    # Sort the exams by date and course name
+    with phase('sort'):
+        student_exams.sort(key=lambda x: (x['date'], next(c['course_name'] for c in courses if c['course_code'] == x['course_code'])))
 
-    # Determine the maximum length of course names for formatting
-    max_course_name_length = max(len(next(c['course_name'] for c in courses if c['course_code'] == exam['course_code'])) for exam in student_exams)
+        # Determine the maximum length of course names for formatting
+        max_course_name_length = max(len(next(c['course_name'] for c in courses if c['course_code'] == exam['course_code'])) for exam in student_exams)
 
     # Write to the file
-    with open(fileout, 'w', encoding='utf8') as f:
+    with phase('write'), open(fileout, 'w', encoding='utf8') as f:
         # Header
         f.write(
             f"Exams taken by student {student['stud_surname']} {student['stud_name']}, student number {stud_code}\n")
@@ -109,43 +168,33 @@ def print_recorded_exams(stud_code, dbsize, fileout):
     return len(student_exams)
 
 
+@instrumented
 def print_top_students(dbsize, fileout):
-    # Load data and compute top students
-    with open(dbsize + '_students.json', 'r', encoding='utf8') as f:
-        students = json.load(f)
-    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
-        exams = json.load(f)
-
-    student_averages = {}
-    for student in students:
-        student_exams = [e for e in exams if e['stud_code'] == student['stud_code']]
-        if student_exams:
-            average = round(sum(e['grade'] for e in student_exams) / len(student_exams), 2)
-            if average >= 28:
-                student_averages[student['stud_code']] = (average, f"{student['stud_surname']} {student['stud_name']}")
-
-    # Determine the maximum length of the names for formatting
-    max_name_length = max(len(student[1]) for student in student_averages.values())
-
-    sorted_students = sorted(student_averages.items(), key=lambda x: (-x[1][0], x[1][1], x[0]))
+    # Compute top students and write the padded report with a single write
+    rows, width = top_averages(dbsize)
+    with phase('write'):
+        return report.write_top_students(rows, fileout, width)
 
-    # Formatting and writing to file
-    with open(fileout, 'w', encoding='utf8') as f:
-        for stud_code, (average, name) in sorted_students:
-            f.write(f"{name:<{max_name_length}}\t{average}\n")
 
-    # Return the number of rows saved
-    return len(sorted_students)
+@instrumented
+def print_top_reports(dbsize, reports):
+    # Write one report for each (fileout, threshold) with a single pass on the sorted students
+    rows, _ = top_averages(dbsize, min(reports.values(), default=28))
+    with phase('write'):
+        return report.write_top_reports(rows, reports)
 
 
+@instrumented
 def print_exam_record(exam_code, dbsize, fileout):
-    # open the file
-    with open(dbsize + '_exams.json', 'r', encoding='utf8') as f:
-        exams = json.load(f)
-    # filter the exam
-    exams = [e for e in exams if e['exam_code'] == exam_code]
-    # open the output file
-    with open(fileout, 'w', encoding='utf8') as file:
+    # load the tables
+    exams = load_table(dbsize, 'exams')
+    students = load_table(dbsize, 'students')
+    courses = load_table(dbsize, 'courses')
+    teachers = load_table(dbsize, 'teachers')
+    with phase('filter'):
+        count('rows_scanned', len(exams) + len(students) + len(courses) + len(teachers))
+        # filter the exam
+        exams = [e for e in exams if e['exam_code'] == exam_code]
         #get the exam code, course code, date, grade, and student code
         exam_code = exams[0]['exam_code']
         course_code = exams[0]['course_code']
@@ -153,31 +202,25 @@ def print_exam_record(exam_code, dbsize, fileout):
         grade = exams[0]['grade']
         stud_code = exams[0]['stud_code']
         #get the student name and surname from the student code
-        with open(dbsize + '_students.json', 'r', encoding='utf8') as f:
-            students = json.load(f)
         students = [s for s in students if s['stud_code'] == stud_code]
         stud_name = students[0]['stud_name']
         stud_surname = students[0]['stud_surname']
         #get the course name from the course code and the teacher code
-        with open(dbsize + '_courses.json', 'r', encoding='utf8') as f:
-            courses = json.load(f)
         courses = [c for c in courses if c['course_code'] == course_code]
         course_name = courses[0]['course_name']
         teach_code = courses[0]['teach_code']
         #get the teacher name and surname from the teacher code
-        with open(dbsize + '_teachers.json', 'r', encoding='utf8') as f:
-            teachers = json.load(f)
         teachers = [t for t in teachers if t['teach_code'] == teach_code]
         teach_name = teachers[0]['teach_name']
         teach_surname = teachers[0]['teach_surname']
-        #write the exam record
 
+    #write the exam record
+    with phase('write'), open(fileout, 'w', encoding='utf8') as file:
         file.write('The student {} {}, student number {}, took on {} the {} exam with the teacher {} {} with grade {}.'.format( stud_name,stud_surname, stud_code, date, course_name, teach_name, teach_surname, grade))
 
     # return the grade
     return grade
-    pass
+
 
 if __name__ == '__main__':
     print_top_students('large', 'top_students.txt')
-
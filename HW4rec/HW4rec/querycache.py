@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Memoization of the HW4 queries with bounded LRU eviction.
+
+The results are cached with key (function, arguments, dbsize, dataset
+version), where the version is the one of the ExamDB the query ran on:
+versions are unique across all the ExamDB objects, so after a full reload
+(ExamDB.refresh) or when a new ExamDB replaces the old one, the old
+results are never reused.
+Every entry also records the students, courses and teachers it depends on,
+so when exams are added to a dataset only the affected entries are dropped:
+    - student_average(s)  depends on ('student', s)
+    - course_average(c)   depends on ('course', c)
+    - teacher_average(t)  depends on ('teacher', t)
+    - top_students()      depends on every exam
+
+The module functions have the same signatures as the ones in program01
+and use a shared default cache.
+'''
+import weakref
+from collections import OrderedDict
+
+import examdb
+
+# tag of the entries depending on every exam of the dataset
+ALL_EXAMS = ('exams',)
+
+
+class QueryCache:
+
+    def __init__(self, maxsize=1024, opener=examdb.open_db):
+        self.maxsize = maxsize
+        self.opener = opener
+        self.entries = OrderedDict()    # key -> (value, tags)
+        self.by_tag = {}                # (dbsize, tag) -> set of keys
+        self.attached = weakref.WeakSet()   # datasets we listen to
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def db(self, dbsize):
+        db = self.opener(dbsize)
+        if db not in self.attached:
+            self.attached.add(db)
+            db.listeners.append(self.invalidate)
+        return db
+
+    def _forget(self, key):
+        _, tags = self.entries.pop(key)
+        dbsize = key[2]
+        for tag in tags:
+            keys = self.by_tag.get((dbsize, tag))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_tag[dbsize, tag]
+
+    def lookup(self, name, args, dbsize, tags, compute):
+        ''' Returns the cached result of query "name" on the dataset "dbsize",
+            computing it with compute(db) on a miss. '''
+        db = self.db(dbsize)
+        key = (name, args, dbsize, db.version)
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[0]
+        self.misses += 1
+        value = compute(db)
+        self.entries[key] = (value, tags)
+        for tag in tags:
+            self.by_tag.setdefault((dbsize, tag), set()).add(key)
+        while len(self.entries) > self.maxsize:
+            self._forget(next(iter(self.entries)))
+            self.evictions += 1
+        return value
+
+    def invalidate(self, db, tags):
+        ''' ExamDB listener: drops the entries depending on "tags"
+            (all the entries of the dataset if tags is None). '''
+        if tags is None:
+            keys = [key for key in self.entries if key[2] == db.dbsize]
+        else:
+            keys = set(self.by_tag.get((db.dbsize, ALL_EXAMS), ()))
+            for tag in tags:
+                keys.update(self.by_tag.get((db.dbsize, tag), ()))
+        for key in keys:
+            self._forget(key)
+        self.invalidations += len(keys)
+
+    def clear(self):
+        self.entries.clear()
+        self.by_tag.clear()
+
+    ############# QUERIES ###########
+    def student_average(self, stud_code, dbsize):
+        return self.lookup('student_average', (stud_code,), dbsize, (('student', stud_code),),
+                           lambda db: db.student_average(stud_code))
+
+    def course_average(self, course_code, dbsize):
+        return self.lookup('course_average', (course_code,), dbsize, (('course', course_code),),
+                           lambda db: db.course_average(course_code))
+
+    def teacher_average(self, teach_code, dbsize):
+        return self.lookup('teacher_average', (teach_code,), dbsize, (('teacher', teach_code),),
+                           lambda db: db.teacher_average(teach_code))
+
+    def top_students(self, dbsize):
+        # a copy, so that the caller cannot modify the cached list
+        return list(self.lookup('top_students', (), dbsize, (ALL_EXAMS,),
+                                lambda db: db.top_students()))
+
+
+cache = QueryCache()
+
+
+def student_average(stud_code, dbsize):
+    return cache.student_average(stud_code, dbsize)
+
+
+def course_average(course_code, dbsize):
+    return cache.course_average(course_code, dbsize)
+
+
+def teacher_average(teach_code, dbsize):
+    return cache.teacher_average(teach_code, dbsize)
+
+
+def top_students(dbsize):
+    return cache.top_students(dbsize)
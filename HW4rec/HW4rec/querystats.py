@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Optional instrumentation of the HW4 queries.
+
+The query functions of program01, examdb and sqlitedb (decorated with
+@instrumented) report what they are doing to this module: each call is
+split in phases (open, parse, index, filter, sort, write, ...) whose times
+are summed, and counters keep the rows scanned and the index hits and
+misses. Nothing is measured until enable() is called:
+
+    stats = querystats.enable()
+    program01.course_average('MASP0x6f69a0', 'large')
+    stats.dump('stats.json')
+    stats.over_budget()     # queries slower than the test_01.py timeouts
+
+The statistics are kept by query and database size, e.g.
+'course_average[large]'.
+'''
+import functools
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+# time budget in seconds of a single call, as the timeouts of test_01.py
+BUDGETS = {
+    'student_average':      {'small': 0.5, 'medium': 0.5, 'large': 0.5},
+    'course_average':       {'small': 0.5, 'medium': 0.5, 'large': 0.5},
+    'teacher_average':      {'small': 0.5, 'medium': 0.5, 'large': 0.5},
+    'top_students':         {'small': 2,   'medium': 3,   'large': 4},
+    'print_recorded_exams': {'small': 0.5, 'medium': 0.5, 'large': 0.5},
+    'print_top_students':   {'small': 2,   'medium': 3,   'large': 4},
+    'print_exam_record':    {'small': 0.5, 'medium': 0.5, 'large': 0.5},
+}
+
+
+class QueryStats:
+
+    def __init__(self):
+        self.queries = {}   # 'name[dbsize]' -> statistics of the query
+        self.current = []   # stack of the queries being executed
+
+    def entry(self):
+        key = self.current[-1] if self.current else 'other'
+        entry = self.queries.get(key)
+        if entry is None:
+            entry = self.queries[key] = {'calls': 0, 'total': 0.0, 'max': 0.0, 'phases': {}, 'counters': {}}
+        return entry
+
+    @contextmanager
+    def query(self, name, dbsize):
+        ''' Context of a call of the query "name" on the database "dbsize". '''
+        self.current.append(f"{name}[{dbsize}]")
+        entry = self.entry()
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            entry['calls'] += 1
+            entry['total'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+            self.current.pop()
+
+    @contextmanager
+    def phase(self, name):
+        ''' Context of the phase "name" of the current query. '''
+        phases = self.entry()['phases']
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, n=1):
+        ''' Adds "n" to the counter "name" of the current query. '''
+        counters = self.entry()['counters']
+        counters[name] = counters.get(name, 0) + n
+
+    def over_budget(self, budgets=BUDGETS):
+        ''' Returns the dict 'name[dbsize]' -> (slowest call, budget) of the
+            queries with a call slower than their budget. '''
+        over = {}
+        for key, entry in self.queries.items():
+            name, _, dbsize = key[:-1].partition('[')
+            budget = budgets.get(name, {}).get(dbsize)
+            if budget is not None and entry['max'] > budget:
+                over[key] = (entry['max'], budget)
+        return over
+
+    def to_json(self):
+        return json.dumps(self.queries, indent=1)
+
+    def dump(self, fileout):
+        with open(fileout, 'w', encoding='utf8') as f:
+            f.write(self.to_json())
+
+
+# statistics being collected (None when disabled)
+stats = None
+_disabled = nullcontext()
+
+
+def enable():
+    ''' Starts collecting statistics, returns the new QueryStats. '''
+    global stats
+    stats = QueryStats()
+    return stats
+
+
+def disable():
+    ''' Stops collecting statistics, returns the collected ones. '''
+    global stats
+    collected, stats = stats, None
+    return collected
+
+
+def query(name, dbsize):
+    return _disabled if stats is None else stats.query(name, dbsize)
+
+
+def phase(name):
+    return _disabled if stats is None else stats.phase(name)
+
+
+def count(name, n=1):
+    if stats is not None:
+        stats.count(name, n)
+
+
+def instrumented(func):
+    ''' Decorator of the query functions with a dbsize parameter: when the
+        statistics are enabled, every call is recorded as a query. '''
+    position = func.__code__.co_varnames.index('dbsize')
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if stats is None:
+            return func(*args, **kwargs)
+        dbsize = args[position] if position < len(args) else kwargs['dbsize']
+        with stats.query(func.__name__, dbsize):
+            return func(*args, **kwargs)
+    return wrapper
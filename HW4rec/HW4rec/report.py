@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Rendering of the HW4 top students reports.
+
+A report has one line per student, the full name padded to the length of
+the longest name of the report, a tab and the average:
+
+    Abucar Osman Mariarosaria	30.4
+    Iacometti Monica         	29.4
+
+The rows are tuples (stud_code, average, name) already sorted as in
+top_students (decreasing average). The whole report is rendered in memory
+and written with a single write.
+
+Since the rows are sorted by decreasing average, the report of the
+students with average >= t is a prefix of the rows: write_top_reports
+writes the reports of several thresholds with one pass over the rows.
+'''
+
+
+def name_width(rows):
+    return max((len(name) for _, _, name in rows), default=0)
+
+
+def render_top_students(rows, width=None):
+    ''' Returns the text of the report of the "rows", padding the names to
+        "width" characters. The top_averages functions return the width
+        together with the rows; without it, it is computed with an extra
+        pass on the rows. '''
+    if width is None:
+        width = name_width(rows)
+    return ''.join([f"{name:<{width}}\t{avg}\n" for _, avg, name in rows])
+
+
+def write_top_students(rows, fileout, width=None):
+    ''' Writes the report of the "rows" in the file "fileout".
+        Returns the number of rows written. '''
+    with open(fileout, 'w', encoding='utf8') as f:
+        f.write(render_top_students(rows, width))
+    return len(rows)
+
+
+def write_top_reports(rows, reports):
+    ''' Writes several reports of the "rows" at once.
+        "reports" is a dict fileout -> threshold: each file gets the rows
+        with average >= threshold. Returns the dict fileout -> rows written. '''
+    # one pass: for every prefix of the rows, its length and name width
+    ends = sorted(set(reports.values()), reverse=True)
+    cuts = {}
+    width = 0
+    i = 0
+    for threshold in ends:
+        while i < len(rows) and rows[i][1] >= threshold:
+            width = max(width, len(rows[i][2]))
+            i += 1
+        cuts[threshold] = (i, width)
+    # the reports with the same padding share the lines of the longest one
+    longest = {}
+    for end, width in cuts.values():
+        longest[width] = max(end, longest.get(width, 0))
+    rendered = {width: [f"{name:<{width}}\t{avg}\n" for _, avg, name in rows[:end]]
+                for width, end in longest.items()}
+    counts = {}
+    for fileout, threshold in reports.items():
+        end, width = cuts[threshold]
+        with open(fileout, 'w', encoding='utf8') as f:
+            f.writelines(rendered[width][:end])
+        counts[fileout] = end
+    return counts
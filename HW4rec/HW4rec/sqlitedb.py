@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+SQLite backend of the HW4 exam database.
+
+The four tables <dbsize>_students.json, <dbsize>_courses.json,
+<dbsize>_exams.json and <dbsize>_teachers.json are imported once into the
+file <dbsize>.sqlite, indexed on the codes used by the queries.
+The file is imported again when one of the json files is modified, also
+while its connection is open: every query checks the modification times
+of the json files (four os.stat calls).
+
+The module functions have the same signatures as the ones in program01,
+return the same (rounded) values and write the same output files, but
+they compute the aggregates in SQL: the exams are never loaded in memory.
+'''
+import json
+import os
+import sqlite3
+
+import report
+from querystats import instrumented
+from tables import TABLES, average
+
+SCHEMA = '''
+CREATE TABLE students (stud_code TEXT PRIMARY KEY, stud_name TEXT, stud_surname TEXT, stud_email TEXT);
+CREATE TABLE teachers (teach_code TEXT PRIMARY KEY, teach_name TEXT, teach_surname TEXT, teach_email TEXT);
+CREATE TABLE courses (course_code TEXT PRIMARY KEY, course_name TEXT, teach_code TEXT);
+CREATE TABLE exams (exam_code INTEGER, course_code TEXT, stud_code TEXT, date TEXT, grade INTEGER);
+CREATE TABLE sources (name TEXT PRIMARY KEY, mtime INTEGER);
+CREATE INDEX courses_teacher ON courses (teach_code);
+CREATE INDEX exams_student ON exams (stud_code, grade);
+CREATE INDEX exams_course ON exams (course_code, grade);
+CREATE INDEX exams_code ON exams (exam_code);
+'''
+
+COLUMNS = {
+    'students': ('stud_code', 'stud_name', 'stud_surname', 'stud_email'),
+    'teachers': ('teach_code', 'teach_name', 'teach_surname', 'teach_email'),
+    'courses':  ('course_code', 'course_name', 'teach_code'),
+    'exams':    ('exam_code', 'course_code', 'stud_code', 'date', 'grade'),
+}
+
+
+def sources(dbsize):
+    ''' Returns the dict json file -> modification time of the database. '''
+    names = [dbsize + '_' + table + '.json' for table in TABLES]
+    return {name: os.stat(name).st_mtime_ns for name in names}
+
+
+def import_db(dbsize, path=None):
+    ''' Imports the json tables of "dbsize" into the SQLite file "path"
+        (by default <dbsize>.sqlite). Returns the open connection. '''
+    path = path or dbsize + '.sqlite'
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript(SCHEMA)
+        for table in TABLES:
+            columns = COLUMNS[table]
+            with open(dbsize + '_' + table + '.json', 'r', encoding='utf8') as f:
+                rows = json.load(f)
+            # the first row wins on duplicated codes, as in program01
+            conn.executemany(f"INSERT OR IGNORE INTO {table} VALUES ({','.join('?' * len(columns))})",
+                             ([row[c] for c in columns] for row in rows))
+            del rows
+        conn.executemany('INSERT INTO sources VALUES (?, ?)', sources(dbsize).items())
+    conn.execute('ANALYZE')
+    return conn
+
+
+def is_current(conn, dbsize):
+    try:
+        return dict(conn.execute('SELECT name, mtime FROM sources')) == sources(dbsize)
+    except sqlite3.DatabaseError:
+        return False
+
+
+# open connections, by dbsize
+databases = {}
+# modification times of the json files imported in the open connections, by dbsize
+imported = {}
+
+
+def connect(dbsize):
+    ''' Returns the connection to the database "dbsize", importing the json
+        tables if the SQLite file is missing or older than them. '''
+    conn = databases.get(dbsize)
+    current = sources(dbsize)
+    if conn is not None and imported[dbsize] != current:
+        close(dbsize)
+        conn = None
+    if conn is None:
+        path = dbsize + '.sqlite'
+        if os.path.exists(path):
+            conn = sqlite3.connect(path)
+            if not is_current(conn, dbsize):
+                conn.close()
+                conn = None
+        if conn is None:
+            conn = import_db(dbsize, path)
+        databases[dbsize] = conn
+        imported[dbsize] = current
+    return conn
+
+
+def close(dbsize=None):
+    ''' Closes the connection to the database "dbsize" (all of them if None). '''
+    for name in [dbsize] if dbsize is not None else list(databases):
+        conn = databases.pop(name, None)
+        imported.pop(name, None)
+        if conn is not None:
+            conn.close()
+
+
+############# QUERIES ###########
+@instrumented
+def student_average(stud_code, dbsize):
+    return average(*connect(dbsize).execute(
+        'SELECT TOTAL(grade), COUNT(*) FROM exams WHERE stud_code = ?', (stud_code,)).fetchone())
+
+
+@instrumented
+def course_average(course_code, dbsize):
+    return average(*connect(dbsize).execute(
+        'SELECT TOTAL(grade), COUNT(*) FROM exams WHERE course_code = ?', (course_code,)).fetchone())
+
+
+@instrumented
+def teacher_average(teach_code, dbsize):
+    return average(*connect(dbsize).execute(
+        '''SELECT TOTAL(e.grade), COUNT(*) FROM courses c JOIN exams e ON e.course_code = c.course_code
+           WHERE c.teach_code = ?''', (teach_code,)).fetchone())
+
+
+@instrumented
+def teacher_averages(dbsize):
+    conn = connect(dbsize)
+    averages = {code: 0 for code, in conn.execute('SELECT teach_code FROM teachers')}
+    for code, total, count in conn.execute(
+            '''SELECT c.teach_code, SUM(e.grade), COUNT(*) FROM courses c JOIN exams e ON e.course_code = c.course_code
+               GROUP BY c.teach_code'''):
+        averages[code] = average(total, count)
+    return averages
+
+
+def top_averages(dbsize, threshold=28):
+    ''' Returns (rows, width): the list of (stud_code, average, full name)
+        of the students with an average >= threshold, sorted as in
+        top_students, and the length of the longest name. '''
+    rows = []
+    width = 0
+    for stud_code, total, count, name in connect(dbsize).execute(
+            '''SELECT s.stud_code, SUM(e.grade), COUNT(*), s.stud_surname || ' ' || s.stud_name
+               FROM exams e JOIN students s ON s.stud_code = e.stud_code
+               GROUP BY s.stud_code HAVING 1.0 * SUM(e.grade) / COUNT(*) >= ?''', (threshold - 0.005,)):
+        avg = average(total, count)
+        if avg >= threshold:
+            rows.append((stud_code, avg, name))
+            width = max(width, len(name))
+    rows.sort(key=lambda x: (-x[1], x[2], x[0]))
+    return rows, width
+
+
+@instrumented
+def top_students(dbsize):
+    return [code for code, _, _ in top_averages(dbsize)[0]]
+
+
+@instrumented
+def print_recorded_exams(stud_code, dbsize, fileout):
+    conn = connect(dbsize)
+    student = conn.execute('SELECT stud_name, stud_surname FROM students WHERE stud_code = ?',
+                           (stud_code,)).fetchone()
+    if not student:
+        return  # Student not found
+    exams = conn.execute('''SELECT c.course_name, e.date, e.grade
+                            FROM exams e JOIN courses c ON c.course_code = e.course_code
+                            WHERE e.stud_code = ? ORDER BY e.date, c.course_name, e.rowid''',
+                         (stud_code,)).fetchall()
+    width = max((len(name) for name, _, _ in exams), default=0)
+    lines = [f"Exams taken by student {student[1]} {student[0]}, student number {stud_code}\n"]
+    for name, date, grade in exams:
+        lines.append(f"{name:<{width}}\t{date}\t{grade}\n")
+    with open(fileout, 'w', encoding='utf8') as f:
+        f.write(''.join(lines))
+    return len(exams)
+
+
+@instrumented
+def print_top_students(dbsize, fileout):
+    rows, width = top_averages(dbsize)
+    return report.write_top_students(rows, fileout, width)
+
+
+@instrumented
+def print_top_reports(dbsize, reports):
+    rows, _ = top_averages(dbsize, min(reports.values(), default=28))
+    return report.write_top_reports(rows, reports)
+
+
+@instrumented
+def print_exam_record(exam_code, dbsize, fileout):
+    stud_name, stud_surname, stud_code, date, course_name, teach_name, teach_surname, grade = connect(dbsize).execute(
+        '''SELECT s.stud_name, s.stud_surname, e.stud_code, e.date, c.course_name, t.teach_name, t.teach_surname, e.grade
+           FROM exams e JOIN students s ON s.stud_code = e.stud_code
+                        JOIN courses c ON c.course_code = e.course_code
+                        JOIN teachers t ON t.teach_code = c.teach_code
+           WHERE e.exam_code = ? ORDER BY e.rowid LIMIT 1''', (exam_code,)).fetchone()
+    with open(fileout, 'w', encoding='utf8') as f:
+        f.write('The student {} {}, student number {}, took on {} the {} exam with the teacher {} {} with grade {}.'.format(
+            stud_name, stud_surname, stud_code, date, course_name, teach_name, teach_surname, grade))
+    return grade
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+String pool shared by the HW4 tables.
+
+json.load creates a new string object for every occurrence of a code, so
+the same course_code or stud_code is stored thousands of times and every
+comparison between two occurrences compares them character by character.
+
+A StringPool is used as object_hook while the tables are parsed: the code,
+name and date fields of every row are replaced by a single canonical
+string object, shared by all the tables loaded with the same pool.
+Equal codes are then the same object, so comparisons and dict lookups
+stop at the identity check, and each distinct value uses memory once.
+'''
+
+CODE_FIELDS = ('stud_code', 'course_code', 'teach_code')
+NAME_FIELDS = ('stud_name', 'stud_surname', 'teach_name', 'teach_surname', 'course_name', 'date')
+
+
+class StringPool:
+
+    def __init__(self, fields=CODE_FIELDS + NAME_FIELDS):
+        self.fields = fields
+        self.strings = {}   # string -> its canonical copy
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, s):
+        ''' Returns the canonical copy of the string "s". '''
+        return self.strings.setdefault(s, s)
+
+    def intern_row(self, row):
+        ''' json object_hook: interns the pooled fields of the "row" dict. '''
+        for field in self.fields:
+            value = row.get(field)
+            if value is not None:
+                row[field] = self.intern(value)
+        return row
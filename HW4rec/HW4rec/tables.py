@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Tables of the HW4 exam database, shared by program01 and by the backends.
+
+A database of size dbsize is made of the four json files
+<dbsize>_students.json, <dbsize>_courses.json, <dbsize>_exams.json and
+<dbsize>_teachers.json. load_table reads one of them and average rounds
+the averages the way every query returns them.
+'''
+import json
+
+from querystats import phase, count
+
+TABLES = ('students', 'courses', 'exams', 'teachers')
+
+
+def load_table(dbsize, table, pool=None):
+    ''' Loads the table "table" of the database of size "dbsize".
+        If a StringPool is given, the codes and names are interned in it. '''
+    with phase('open'):
+        f = open(dbsize + '_' + table + '.json', 'r', encoding='utf8')
+    with f, phase('parse'):
+        if pool is None:
+            rows = json.load(f)
+        else:
+            rows = json.load(f, object_hook=pool.intern_row)
+    count('rows_read', len(rows))
+    return rows
+
+
+def average(total, n):
+    ''' Rounded average of "n" grades summing to "total" (0 if there are no grades). '''
+    if n == 0:
+        return 0
+    return round(total / n, 2)
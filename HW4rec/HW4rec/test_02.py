@@ -0,0 +1,251 @@
+import testlib, os, json, shutil, tempfile
+from ddt import ddt, data, unpack
+
+import program01, examdb, querycache, sqlitedb, dateindex, strpool, loader, examlog, querystats
+
+BACKENDS = [examdb, sqlitedb]
+
+
+@ddt
+class Test(testlib.TestCase):
+
+    ############# BACKENDS vs PROGRAM01 ###########
+    @data(  # function         params
+            ( 'student_average', ('1838026', 'small')),
+            ( 'student_average', ('1662230', 'medium')),
+            ( 'student_average', ('0000000', 'medium')),
+            ( 'course_average',  ('TIPAPFC0xa0bb4a', 'small')),
+            ( 'course_average',  ('MASP0x6f69a0', 'large')),
+            ( 'teacher_average', ('003', 'small')),
+            ( 'teacher_average', ('00059', 'large')),
+            ( 'top_students',    ('small',)),
+            ( 'top_students',    ('large',)),
+            )
+    @unpack
+    def test_backends(self, name, params):
+        expected = getattr(program01, name)(*params)
+        for backend in BACKENDS:
+            with self.subTest(backend=backend.__name__):
+                result = getattr(backend, name)(*params)
+                self.assertEqual(type(result), type(expected))
+                self.assertEqual(result, expected)
+
+    @data(  # function              params                       fexpected
+            ( 'print_recorded_exams', ('1662230', 'medium'), 'expfiles/pre1_m.expen.txt'),
+            ( 'print_top_students',   ('large',),            'expfiles/pts1_l.expit.txt'),
+            ( 'print_exam_record',    (4265, 'large'),       'expfiles/per1_l.expen.txt'),
+            )
+    @unpack
+    def test_backends_files(self, name, params, fexpected):
+        fout = 'test_backends.txt'
+        expected = getattr(program01, name)(*params, fout)
+        for backend in BACKENDS:
+            with self.subTest(backend=backend.__name__):
+                result = getattr(backend, name)(*params, fout)
+                self.assertEqual(result, expected)
+                self.check_text_file(fexpected, fout)
+        os.remove(fout)
+
+    ############# QUERY CACHE ###########
+    def test_cache_invalidation(self):
+        db = examdb.ExamDB.load('small')
+        cache = querycache.QueryCache(maxsize=4, opener=lambda dbsize: db)
+        self.assertEqual(cache.course_average('TIPAPFC0xa0bb4a', 'small'), 24.56)
+        self.assertEqual(cache.student_average('1838026', 'small'), 23.75)
+        self.assertEqual(cache.teacher_average('003', 'small'), 24.64)
+        self.assertEqual(cache.course_average('TIPAPFC0xa0bb4a', 'small'), 24.56)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+        # a new exam of another course and student only drops the top students
+        course = next(c for c in db.courses.values()
+                      if c['teach_code'] != '003' and c['course_code'] != 'TIPAPFC0xa0bb4a')
+        cache.top_students('small')
+        self.assertEqual(len(cache), 4)
+        db.add_exams([{'exam_code': 10**6, 'course_code': course['course_code'],
+                       'stud_code': '1803891', 'date': '2021/01/01', 'grade': 30}])
+        self.assertEqual(len(cache), 3)
+        # a new exam of another course of teacher 003 drops the teacher average
+        db.add_exams([{'exam_code': 10**6 + 1, 'course_code': 'EDIELFAC0x5203a7',
+                       'stud_code': '1803891', 'date': '2021/01/01', 'grade': 30}])
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.teacher_average('003', 'small'), db.teacher_average('003'))
+        # the least recently used entry is evicted
+        cache.top_students('small')
+        cache.student_average('1324812', 'small')
+        self.assertEqual(len(cache), 4)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_cache_new_db(self):
+        # a new ExamDB of the same dbsize never hits the results of the old one
+        dbs = [examdb.ExamDB.load('small')]
+        cache = querycache.QueryCache(opener=lambda dbsize: dbs[-1])
+        self.assertEqual(cache.student_average('1838026', 'small'), 23.75)
+        dbs.append(examdb.ExamDB.load('small'))
+        dbs[-1].add_exams([{'exam_code': 10**6, 'course_code': 'SNL0xadd7c7', 'stud_code': '1838026',
+                            'date': '2021/01/01', 'grade': 30}])
+        self.assertEqual(cache.student_average('1838026', 'small'), dbs[-1].student_average('1838026'))
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(set(cache.attached), set(dbs))
+
+    @data('small', 'medium', 'large')
+    def test_teacher_averages(self, dbsize):
+        with open(dbsize + '_teachers.json', encoding='utf8') as f:
+            expected = {t['teach_code']: program01.teacher_average(t['teach_code'], dbsize) for t in json.load(f)}
+        for backend in [program01] + BACKENDS:
+            with self.subTest(backend=backend.__name__):
+                self.assertEqual(backend.teacher_averages(dbsize), expected)
+
+    ############# REPORTS ###########
+    def test_top_reports(self):
+        reports = {'test_top_28.txt': 28, 'test_top_29.txt': 29, 'test_top_32.txt': 32}
+        for backend in [program01] + BACKENDS:
+            with self.subTest(backend=backend.__name__):
+                counts = backend.print_top_reports('large', reports)
+                self.assertEqual(counts['test_top_28.txt'], 93)
+                self.assertEqual(counts['test_top_32.txt'], 0)
+                self.check_text_file('expfiles/pts1_l.expit.txt', 'test_top_28.txt')
+                with open('test_top_29.txt', encoding='utf8') as f:
+                    lines = f.read().splitlines()
+                self.assertEqual(len(lines), counts['test_top_29.txt'])
+                self.assertTrue(all(float(line.split('\t')[1]) >= 29 for line in lines))
+        for fileout in reports:
+            os.remove(fileout)
+
+    ############# STRING POOL ###########
+    def test_string_pool(self):
+        pool = strpool.StringPool()
+        db = examdb.ExamDB.load('medium', pool)
+        # the same code is a single object in every table
+        for e in db.exams:
+            self.assertIs(e['course_code'], db.courses[e['course_code']]['course_code'])
+            self.assertIs(e['stud_code'], db.students[e['stud_code']]['stud_code'])
+        code = db.exams[0]['course_code']
+        self.assertIs(pool.intern(''.join(list(code))), code)
+        self.assertEqual(db.top_students(), examdb.ExamDB.load('medium').top_students())
+
+    ############# CONCURRENT LOADER ###########
+    @data(False, True)
+    def test_loader(self, processes):
+        databases, timings = loader.load_all(('small', 'large'), processes=processes)
+        self.assertEqual(sorted(databases), ['large', 'small'])
+        self.assertIn('large_exams.json', timings)
+        self.assertIn('large index', timings)
+        self.assertEqual(databases['small'].student_average('1838026'), 23.75)
+        self.assertEqual(databases['large'].top_students(), program01.top_students('large'))
+
+    def test_preload_keeps_open_db(self):
+        db = examdb.open_db('small')
+        loader.preload(('small', 'medium'))
+        self.assertIs(examdb.open_db('small'), db)
+        self.assertIn('medium', examdb.databases)
+
+    ############# EXAM JOURNAL ###########
+    def test_exam_log(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            for table in examdb.TABLES:
+                shutil.copy('small_' + table + '.json', tmp)
+            os.chdir(tmp)
+            try:
+                db = examdb.ExamDB.load('small')
+                cache = querycache.QueryCache(opener=lambda dbsize: db)
+                log = examlog.ExamLog(db, compact_every=3)
+                self.assertEqual(cache.student_average('1838026', 'small'), 23.75)
+                new = [{'exam_code': 10**6 + i, 'course_code': 'SNL0xadd7c7', 'stud_code': '1838026',
+                        'date': '2021/01/0' + str(i), 'grade': 30} for i in range(1, 4)]
+                log.append(new[:2])
+                self.assertEqual(cache.student_average('1838026', 'small'), 25.83)
+                # the journal is replayed when the database is opened again
+                self.assertEqual(examlog.ExamLog(examdb.ExamDB.load('small')).db.student_average('1838026'), 25.83)
+                # the third exam triggers the compaction into the snapshot
+                log.append(new[2:])
+                self.assertFalse(os.path.exists(log.path))
+                self.assertEqual(program01.student_average('1838026', 'small'), 26.43)
+                # invalid and duplicated exams are rejected before reaching the journal
+                for bad in ({'exam_code': 10**6 + 9, 'course_code': 'SNL0xadd7c7', 'stud_code': '1838026',
+                             'date': '2021/01/09'},
+                            dict(new[0]), dict(db.exams[0])):
+                    with self.assertRaises(ValueError):
+                        log.append([bad])
+                self.assertFalse(os.path.exists(log.path))
+                self.assertEqual(examlog.ExamLog(examdb.ExamDB.load('small')).db.student_average('1838026'), 26.43)
+                self.assertEqual(db.student_average('1838026'), 26.43)
+            finally:
+                os.chdir(cwd)
+
+    def test_sqlite_reimport(self):
+        cwd = os.getcwd()
+        sqlitedb.close()
+        with tempfile.TemporaryDirectory() as tmp:
+            for table in examdb.TABLES:
+                shutil.copy('small_' + table + '.json', tmp)
+            os.chdir(tmp)
+            try:
+                self.assertEqual(sqlitedb.student_average('1838026', 'small'), 23.75)
+                with open('small_exams.json', encoding='utf8') as f:
+                    exams = json.load(f)
+                exams.append({'exam_code': 10**6, 'course_code': 'SNL0xadd7c7', 'stud_code': '1838026',
+                              'date': '2021/01/01', 'grade': 30})
+                with open('small_exams.json', 'w', encoding='utf8') as f:
+                    json.dump(exams, f)
+                stat = os.stat('small_exams.json')
+                os.utime('small_exams.json', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+                # the open connection is replaced by a new import
+                self.assertEqual(sqlitedb.student_average('1838026', 'small'), 25.0)
+                self.assertEqual(program01.student_average('1838026', 'small'), 25.0)
+            finally:
+                sqlitedb.close()
+                os.chdir(cwd)
+
+    ############# DATE INDEX ###########
+    @data(  # kind       code              start         end
+            ( 'course',  'MASP0x6f69a0',   '2018/01/01', '2019/12/31'),
+            ( 'course',  'MASP0x6f69a0',   '2017/01/01', '2021/12/31'),
+            ( 'student', '1970461',        '2019/06/01', '2020/06/01'),
+            ( 'teacher', '00059',          '2020/01/01', '2020/12/31'),
+            ( 'teacher', '00059',          '2030/01/01', '2031/01/01'),
+            )
+    @unpack
+    def test_date_index(self, kind, code, start, end):
+        db = examdb.ExamDB.load('large')
+        index = dateindex.DateIndex(db)
+        def expected():
+            exams = [e for e in index.exams_of(kind, code) if start <= e['date'] <= end]
+            return examdb.average(sum(e['grade'] for e in exams), len(exams))
+        self.assertEqual(index.average_between(kind, code, start, end), expected())
+        # the touched keys are rebuilt after new exams are added
+        course = db.courses_by_teacher['00059'][0] if kind == 'teacher' else 'MASP0x6f69a0'
+        stud_code = code if kind == 'student' else '1970461'
+        db.add_exams([{'exam_code': 10**6, 'course_code': course, 'stud_code': stud_code,
+                       'date': start, 'grade': 30}])
+        self.assertEqual(index.average_between(kind, code, start, end), expected())
+
+    ############# STATISTICS ###########
+    def test_query_stats(self):
+        stats = querystats.enable()
+        try:
+            program01.course_average('MASP0x6f69a0', 'large')
+            program01.print_top_students('large', 'test_stats.txt')
+            examdb.databases.pop('medium', None)
+            examdb.student_average('1662230', 'medium')
+            examdb.student_average('0000000', 'medium')
+            sqlitedb.teacher_average('00059', 'small')
+        finally:
+            self.assertIs(querystats.disable(), stats)
+        os.remove('test_stats.txt')
+        entry = stats.queries['course_average[large]']
+        self.assertEqual(entry['calls'], 1)
+        self.assertEqual(set(entry['phases']), {'open', 'parse', 'filter'})
+        self.assertEqual(entry['counters']['rows_scanned'], 5015)
+        self.assertIn('write', stats.queries['print_top_students[large]']['phases'])
+        entry = stats.queries['student_average[medium]']
+        self.assertEqual(entry['calls'], 2)
+        self.assertIn('index', entry['phases'])
+        self.assertEqual((entry['counters']['index_hits'], entry['counters']['index_misses']), (1, 1))
+        self.assertEqual(stats.queries['teacher_average[small]']['calls'], 1)
+        self.assertEqual(json.loads(stats.to_json()), stats.queries)
+        self.assertEqual(stats.over_budget({'course_average': {'large': 0}}),
+                         {'course_average[large]': (stats.queries['course_average[large]']['max'], 0)})
+
+
+if __name__ == '__main__':
+    Test.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Batch runner of the HW6 program over many city maps.
+
+The manifest is a text file with one map per line: the paths of the PNG
+image, of the spaceships file and of the output file, separated by spaces
+or tabs (empty lines and lines starting with # are skipped):
+
+    images/image0.png   rectangles/rectangles0.txt   out/image0.txt
+
+The maps are given to a pool of processes that stay alive for the whole
+batch: program01 and pngmatrix are imported once per worker, not once per
+map. For every map the batch reports the seconds spent, the number of
+buildings and of spaceships that can land, or the error; at the end the
+number of maps per second and the failures:
+
+    python batch.py manifest.txt -w 4
+    python batch.py --examples          # all the images of the exercise
+'''
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def read_manifest(fname):
+    ''' Returns the list of (image, specs, output) triples of the manifest. '''
+    jobs = []
+    with open(fname, 'r', encoding='utf8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split()
+            if len(fields) != 3:
+                raise ValueError(f"{fname}:{number}: expected image, specs and output, got {line!r}")
+            jobs.append(tuple(fields))
+    return jobs
+
+
+def example_manifest(outdir='test_output'):
+    ''' The (image, specs, output) triples of the images of the exercise. '''
+    names = ['example'] + [f"image{i}" for i in range(11)]
+    return [(f"images/{name}.png",
+             'rectangles/' + name.replace('image', 'rectangles') + '.txt',
+             os.path.join(outdir, name + '.txt')) for name in names]
+
+
+def _start_worker():
+    # paid once per process, before the first map
+    global program01
+    import program01
+
+
+def run_job(job):
+    ''' Runs program01.ex on the (image, specs, output) triple.
+        Returns the dict with the outcome of the map. '''
+    image, specs, output = job
+    start = time.perf_counter()
+    result = {'image': image, 'specs': specs, 'output': output}
+    try:
+        landings = program01.ex(image, specs, output)
+        with open(output, 'r') as f:
+            result['buildings'] = sum(1 for line in f if line.strip())
+        result['spacecrafts'] = len(landings)
+        result['landed'] = sum(landings)
+        result['error'] = None
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(jobs, workers=None):
+    ''' Processes the (image, specs, output) triples in a pool of "workers"
+        processes (by default one per CPU).
+        Returns (results, summary): the outcome of every map, in the order
+        of the jobs, and the totals of the batch. '''
+    start = time.perf_counter()
+    for _, _, output in jobs:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker) as pool:
+        results = list(pool.map(run_job, jobs))
+    elapsed = time.perf_counter() - start
+    failures = [r for r in results if r['error']]
+    summary = {'maps': len(results), 'failures': len(failures), 'seconds': elapsed,
+               'maps_per_second': len(results) / elapsed if elapsed else float('inf'),
+               'busy_seconds': sum(r['seconds'] for r in results)}
+    return results, summary
+
+
+def report(results, summary):
+    print(f"{'image':<28}{'seconds':>9}{'buildings':>11}{'landed':>12}")
+    for r in results:
+        if r['error']:
+            print(f"{r['image']:<28}{r['seconds']:>9.3f}  FAILED {r['error']}")
+        else:
+            landed = f"{r['landed']}/{r['spacecrafts']}"
+            print(f"{r['image']:<28}{r['seconds']:>9.3f}{r['buildings']:>11}{landed:>12}")
+    print(f"{summary['maps']} maps in {summary['seconds']:.2f} s ({summary['maps_per_second']:.1f} maps/s, "
+          f"{summary['busy_seconds']:.2f} s of work), {summary['failures']} failed")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', nargs='?')
+    parser.add_argument('--examples', action='store_true', help='run on the images of the exercise')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--json', help='also save the results in this file')
+    args = parser.parse_args()
+    if not args.manifest and not args.examples:
+        parser.error('a manifest or --examples is required')
+    jobs = read_manifest(args.manifest) if args.manifest else example_manifest()
+    results, summary = run_batch(jobs, args.workers)
+    report(results, summary)
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as f:
+            json.dump({'summary': summary, 'maps': results}, f, indent=1)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Benchmark of the HW6 phases on large synthetic city maps.
+
+For every map size a city and its spaceships are generated with citygen
+(in the "synthetic" directory, reused if already there), then every phase
+is timed separately, and then run again to measure the peak of the
+allocated memory (tracemalloc slows the code down too much to do both in
+the same run; --no-memory skips the second run):
+    - load:     load_png8_packed
+    - detect:   detect_buildings
+    - write:    document_buildings
+    - banded:   scan_city, the load and detection in bands of rows
+    - landing:  assess_landing_zones, once for each landing method
+                (precomputation included)
+
+The 'scan' method is the reference pixel by pixel search: it is very slow
+on large maps and it is run only if asked with -m scan.
+
+    python bench.py 256 1024 4096 -m mer -m bits
+    python bench.py 512 -m sat -m bits -n 200
+'''
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import citygen
+import pngmatrix
+import program01
+
+
+def measure(func, *args, memory=True):
+    ''' Calls func(*args), and again with tracemalloc if "memory".
+        Returns (result, seconds, peak KiB or None). '''
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    if not memory:
+        return result, seconds, None
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 1024
+
+
+def benchmark(sizes, methods=None, spacecrafts=1000, outdir='synthetic', memory=True):
+    ''' Yields the (size, phase, seconds, peak KiB, info) rows, as soon as
+        every phase is measured. '''
+    methods = methods or [m for m in program01.LANDING_METHODS if m != 'scan']
+    with tempfile.TemporaryDirectory() as tmp:
+        fileout = os.path.join(tmp, 'buildings.txt')
+        for size in sizes:
+            png_file, specs_file = os.path.join(outdir, f"city{size}.png"), os.path.join(outdir, f"city{size}.txt")
+            if not (os.path.exists(png_file) and os.path.exists(specs_file)):
+                citygen.make_city(outdir, size, spacecrafts=spacecrafts)
+            crafts = program01.load_spacecraft_specs(specs_file)[:spacecrafts]
+
+            image, seconds, peak = measure(pngmatrix.load_png8_packed, png_file, memory=memory)
+            yield (size, 'load', seconds, peak, f"{image.width}x{image.height}")
+            buildings, seconds, peak = measure(program01.detect_buildings, image, memory=memory)
+            yield (size, 'detect', seconds, peak, f"{len(buildings)} buildings")
+            _, seconds, peak = measure(program01.document_buildings, buildings, fileout, memory=memory)
+            yield (size, 'write', seconds, peak, '')
+            _, seconds, peak = measure(program01.scan_city, png_file, memory=memory)
+            yield (size, 'banded', seconds, peak, '')
+            for method in methods:
+                landed, seconds, peak = measure(program01.assess_landing_zones, image, crafts, method, memory=memory)
+                yield (size, 'landing ' + method, seconds, peak, f"{sum(landed)}/{len(landed)} landed")
+
+
+def report(rows):
+    ''' Prints the rows as they come. Returns the list of the rows. '''
+    print(f"{'size':>6}  {'phase':<14}{'seconds':>10}{'peak KiB':>12}  info")
+    printed = []
+    for row in rows:
+        size, phase, seconds, peak, info = row
+        peak = '-' if peak is None else f"{peak:.0f}"
+        print(f"{size:>6}  {phase:<14}{seconds:>10.3f}{peak:>12}  {info}", flush=True)
+        printed.append(row)
+    return printed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('size', type=int, nargs='*', default=[256, 1024, 4096])
+    parser.add_argument('-m', '--method', action='append', choices=list(program01.LANDING_METHODS))
+    parser.add_argument('-n', '--spacecrafts', type=int, default=1000, help='spaceships per map')
+    parser.add_argument('-o', '--outdir', default='synthetic')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='do not measure the peak memory')
+    parser.add_argument('--json', help='also save the results in this file')
+    args = parser.parse_args()
+    rows = report(benchmark(args.size, args.method, args.spacecrafts, args.outdir, args.memory))
+    if args.json:
+        with open(args.json, 'w', encoding='utf8') as f:
+            json.dump([{'size': s, 'phase': p, 'seconds': t, 'peak': m, 'info': i} for s, p, t, m, i in rows],
+                      f, indent=1)
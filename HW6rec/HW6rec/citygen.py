@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Generator of synthetic HW6 city maps.
+
+A city is a black image of width x height pixels with "buildings"
+rectangles of distinct random colours, that neither overlap nor touch
+each other. The buildings have the same sizes on every map (and by
+default the same density, one every 400 pixels): a larger map is a
+larger city, not a zoomed one. The image is written row by row (the
+whole matrix is never in memory), so maps up to 4096x4096 and more can
+be generated.
+Together with the map, a spaceships file with random (W, H, D) triples
+separated by random whitespace is written, as the rectangles files.
+
+Usage:
+    python citygen.py 4096                  # synthetic/city4096.png, synthetic/city4096.txt
+    python citygen.py 1024 768 -b 5000 -s 2000
+'''
+import argparse
+import os
+import random
+
+import png
+
+
+def generate_city(width, height, buildings, max_side=16, seed=0, attempts=20):
+    ''' Returns the list of (x, y, w, h, (r, g, b)) buildings of a random city.
+        The sides are at most "max_side" pixels; fewer buildings are
+        returned if the map is too crowded. '''
+    rnd = random.Random(seed)
+    colours = rnd.sample(range(1, 1 << 24), buildings)
+    # one integer per row, with the bits of the occupied pixels
+    occupied = [0] * height
+    city = []
+    for colour in colours:
+        for _ in range(attempts):
+            w = rnd.randint(1, min(max_side, width))
+            h = rnd.randint(1, min(max_side, height))
+            x = rnd.randrange(width - w + 1)
+            y = rnd.randrange(height - h + 1)
+            # the building and the pixels around it must be free
+            mask = ((1 << (w + 2)) - 1) << x >> 1
+            if not any(row & mask for row in occupied[max(0, y - 1):y + h + 1]):
+                for i in range(y, y + h):
+                    occupied[i] |= mask
+                city.append((x, y, w, h, (colour >> 16, (colour >> 8) & 255, colour & 255)))
+                break
+    return city
+
+
+def render_rows(width, height, city):
+    ''' Yields the rows of the map, as bytearrays of 3 * width bytes. '''
+    starting = {}
+    for building in city:
+        starting.setdefault(building[1], []).append(building)
+    active = []
+    for y in range(height):
+        active = [b for b in active if b[1] + b[3] > y] + starting.get(y, [])
+        row = bytearray(3 * width)
+        for x, _, w, _, colour in active:
+            row[3 * x:3 * (x + w)] = bytes(colour) * w
+        yield row
+
+
+def save_city(fname, width, height, city):
+    with open(fname, 'wb') as f:
+        png.Writer(width, height, greyscale=False, bitdepth=8).write(f, render_rows(width, height, city))
+
+
+def random_spacecrafts(n, max_side, seed=0):
+    ''' Returns "n" random (W, H, D) spaceships, some of them with zeros. '''
+    rnd = random.Random(seed)
+    return [(rnd.randint(0, max_side), rnd.randint(0, max_side), rnd.randint(0, max_side // 2))
+            for _ in range(n)]
+
+
+def save_spacecrafts(fname, spacecrafts, seed=0):
+    rnd = random.Random(seed)
+    with open(fname, 'w') as f:
+        for craft in spacecrafts:
+            f.write(''.join(str(v) + rnd.choice((' ', '  ', '\t', '\n')) for v in craft) + '\n')
+
+
+def make_city(outdir, width, height=None, buildings=None, spacecrafts=1000, seed=0):
+    ''' Generates and saves a city and its spaceships in "outdir".
+        Returns the paths of the PNG and of the spaceships file. '''
+    height = height or width
+    buildings = buildings or width * height // 400
+    city = generate_city(width, height, buildings, seed=seed)
+    os.makedirs(outdir, exist_ok=True)
+    name = os.path.join(outdir, f"city{width}" + (f"x{height}" if height != width else ''))
+    save_city(name + '.png', width, height, city)
+    save_spacecrafts(name + '.txt', random_spacecrafts(spacecrafts, 32, seed), seed)
+    return name + '.png', name + '.txt'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('width', type=int)
+    parser.add_argument('height', type=int, nargs='?')
+    parser.add_argument('-b', '--buildings', type=int, help='buildings to place (default: one per 400 pixels)')
+    parser.add_argument('-s', '--spacecrafts', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--outdir', default='synthetic')
+    args = parser.parse_args()
+    for fname in make_city(args.outdir, args.width, args.height, args.buildings, args.spacecrafts, args.seed):
+        print(fname)
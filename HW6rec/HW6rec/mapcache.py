@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+On-disk cache of the analysis of the HW6 city maps.
+
+The same city map is often checked again with new spaceships. The
+buildings found in a map and its occupancy bits (see
+program01.occupancy_bits) are saved in the json file <sha256>.json of the
+cache directory, named after the SHA-256 of the PNG file: when the map is
+analysed again it is not decoded at all, the spaceships are checked
+directly on the saved bits. A modified map has a different hash, so it is
+analysed again; the old files are never removed.
+
+    program01.ex('images/image10.png', 'rectangles/rectangles10.txt', 'out.txt', cache_dir='.mapcache')
+'''
+import hashlib
+import json
+import os
+
+import program01
+
+VERSION = 1
+
+
+def content_hash(fname, chunk_size=1 << 20):
+    ''' Returns the hex SHA-256 of the content of the file "fname". '''
+    digest = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_entry(path):
+    ''' Returns the analysis saved in "path", None if missing or unusable. '''
+    try:
+        with open(path, 'r', encoding='utf8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return entry if entry.get('version') == VERSION else None
+
+
+def save_entry(path, entry):
+    # written aside and renamed, a reader never sees half a file
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf8') as f:
+        json.dump(entry, f)
+    os.replace(tmp, path)
+
+
+def analyse(image_path, cache_dir, band_height=256):
+    ''' Returns (buildings, rows, width, height) as program01.scan_city,
+        from the cache if the map was already analysed. '''
+    path = os.path.join(cache_dir, content_hash(image_path) + '.json')
+    entry = load_entry(path)
+    if entry is None:
+        buildings, rows, width, height = program01.scan_city(image_path, band_height)
+        os.makedirs(cache_dir, exist_ok=True)
+        save_entry(path, {'version': VERSION, 'width': width, 'height': height,
+                          'buildings': buildings, 'rows': [format(row, 'x') for row in rows]})
+        return buildings, rows, width, height
+    return ([tuple(building) for building in entry['buildings']], [int(row, 16) for row in entry['rows']],
+            entry['width'], entry['height'])
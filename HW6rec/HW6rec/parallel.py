@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+'''
+Parallel evaluation of the HW6 spaceships.
+
+The spaceships do not land at the same time, so each one can be checked
+by a different process. The packed pixels of the map are copied once into
+a block of shared memory: the worker processes of the pool attach to it
+when they start and see the same read-only map, without receiving a copy
+of the image with every task.
+
+The spaceships are split into consecutive chunks (by default one per
+worker, so that the precomputation of the landing method, e.g. the
+summed-area table, is done only once per process), and the answers are
+gathered in the order of the input:
+
+    image = pngmatrix.load_png8_packed('images/image10.png')
+    parallel.assess_parallel(image, spacecrafts, method='sat', workers=4)
+
+program01.assess_landing_zones uses it when called with workers=N.
+'''
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from pngmatrix import PackedImage
+
+# state of a worker process: the shared memory and the image built on it
+_worker = {}
+
+
+def _attach(name, width, height):
+    ''' Initializer of the worker processes: opens the shared map. '''
+    shm = shared_memory.SharedMemory(name=name)
+    pixels = shm.buf.cast('I')[:width * height]
+    _worker['shm'] = shm
+    _worker['image'] = PackedImage(width, height, pixels)
+
+
+def _assess(method, spacecrafts):
+    import program01
+    return program01.LANDING_METHODS[method](_worker['image'], spacecrafts)
+
+
+def split(items, chunks):
+    ''' Splits the list "items" into at most "chunks" consecutive slices
+        of (almost) the same length. '''
+    size, extra = divmod(len(items), chunks)
+    slices, start = [], 0
+    for i in range(chunks):
+        end = start + size + (i < extra)
+        if end > start:
+            slices.append(items[start:end])
+        start = end
+    return slices
+
+
+def assess_parallel(image, spacecrafts, method='sat', workers=None, chunks=None):
+    ''' Returns the list of booleans of program01.assess_landing_zones,
+        computed by a pool of "workers" processes (by default one per CPU)
+        on "chunks" groups of spaceships (by default one per worker). '''
+    spacecrafts = list(spacecrafts)
+    if not spacecrafts:
+        return []
+    workers = workers or os.cpu_count() or 1
+    slices = split(spacecrafts, chunks or workers)
+    pixels = image.pixels
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(pixels) * pixels.itemsize))
+    try:
+        shm.buf[:len(pixels) * pixels.itemsize] = pixels.tobytes()
+        with ProcessPoolExecutor(max_workers=min(workers, len(slices)), initializer=_attach,
+                                 initargs=(shm.name, image.width, image.height)) as pool:
+            results = pool.map(_assess, [method] * len(slices), slices)
+            return [landed for chunk in results for landed in chunk]
+    finally:
+        shm.close()
+        shm.unlink()
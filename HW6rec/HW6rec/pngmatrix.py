@@ -3,6 +3,9 @@
 '''
 Utility functions to load and save image files.
 '''
+import sys
+from array import array
+
 import png
 
 def load_png8(fname):
@@ -37,3 +40,159 @@ def save_png8(img, fname):
     """
     pngimg = png.from_array(img,'RGB')
     pngimg.save(fname)
+
+
+class FlatImage:
+    """ An RGB image stored in a single flat buffer of bytes.
+        The pixel (x, y) is made of the 3 bytes starting at
+        y * stride + 3 * x, with stride = 3 * width.
+        The pixels are not converted to tuples unless asked with pixel().
+    """
+
+    def __init__(self, width, height, data):
+        self.width = width
+        self.height = height
+        self.stride = 3 * width
+        self.data = data
+        self.view = memoryview(data)
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        """ Returns the row y as a memoryview of 3 * width bytes (no copy). """
+        if not 0 <= y < self.height:
+            raise IndexError('row index out of range')
+        start = y * self.stride
+        return self.view[start:start + self.stride]
+
+    def rows(self, y0, y1):
+        """ Returns the rows from y0 (included) to y1 (excluded) as a single
+            memoryview (no copy). """
+        return self.view[y0 * self.stride:y1 * self.stride]
+
+    def pixel(self, x, y):
+        """ Returns the (r, g, b) triple of the pixel (x, y). """
+        i = y * self.stride + 3 * x
+        return tuple(self.data[i:i + 3])
+
+    def to_matrix(self):
+        """ Returns the image as a matrix (list of lists) of (r, g, b) triples,
+            as load_png8 does. """
+        w = self.stride
+        return [ [ (line[i],line[i+1],line[i+2]) for i in range(0, w, 3) ]
+                 for line in (self[y] for y in range(self.height)) ]
+
+
+def load_png8_flat(fname):
+    """ Loads a PNG-8 image from the "fname" file.
+        Returns a FlatImage: the rows are copied one after the other in a
+        single bytearray, so the memory used depends only on the number of
+        bytes of the image (3 per pixel), not on the number of pixels.
+    """
+    with open(fname, mode='rb') as f:
+        reader = png.Reader(file=f)
+        try:
+            w, h, png_img, _ = reader.asRGB8()
+        except:
+            raise ValueError("WARNING: The image has a transparency channel.")
+        stride = 3 * w
+        data = bytearray(stride * h)
+        for y, line in enumerate(png_img):
+            data[y * stride:(y + 1) * stride] = line
+        return FlatImage(w, h, data)
+
+
+def pack(r, g, b):
+    """ Returns the colour (r, g, b) packed in the integer 0xRRGGBB. """
+    return (r << 16) | (g << 8) | b
+
+
+def unpack(c):
+    """ Returns the (r, g, b) triple of the packed colour c = 0xRRGGBB. """
+    return (c >> 16, (c >> 8) & 255, c & 255)
+
+
+class PackedImage:
+    """ An RGB image where every pixel is a single integer 0xRRGGBB.
+        The pixels are stored row after row in the array('I') "pixels":
+        the pixel (x, y) is pixels[y * width + x], the black is 0.
+    """
+
+    def __init__(self, width, height, pixels):
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        """ Returns the row y as an array('I') of packed colours. """
+        if not 0 <= y < self.height:
+            raise IndexError('row index out of range')
+        return self.pixels[y * self.width:(y + 1) * self.width]
+
+    def pixel(self, x, y):
+        """ Returns the packed colour of the pixel (x, y). """
+        return self.pixels[y * self.width + x]
+
+    def to_matrix(self):
+        """ Returns the image as a matrix (list of lists) of (r, g, b) triples. """
+        return [ [ unpack(c) for c in self[y] ] for y in range(self.height) ]
+
+
+def pack_rgb(data):
+    """ Converts the bytes r, g, b, r, g, b, ... into an array('I') of
+        packed colours. The bytes are reordered with slice assignments in
+        the native byte order of the unsigned ints, without Python loops. """
+    n = len(data) // 3
+    buf = bytearray(4 * n)
+    if sys.byteorder == 'little':
+        buf[0::4], buf[1::4], buf[2::4] = data[2::3], data[1::3], data[0::3]
+    else:
+        buf[1::4], buf[2::4], buf[3::4] = data[0::3], data[1::3], data[2::3]
+    pixels = array('I')
+    pixels.frombytes(buf)
+    return pixels
+
+
+def pack_matrix(img):
+    """ Converts a matrix (list of lists) of (r, g, b) triples into a
+        PackedImage. """
+    pixels = array('I', (pack(*c) for row in img for c in row))
+    return PackedImage(len(img[0]) if img else 0, len(img), pixels)
+
+
+def load_png8_packed(fname):
+    """ Loads a PNG-8 image from the "fname" file.
+        Returns a PackedImage, with a 0xRRGGBB integer for every pixel.
+    """
+    flat = load_png8_flat(fname)
+    return PackedImage(flat.width, flat.height, pack_rgb(flat.data))
+
+
+def iter_png8_bands(fname, band_height=256):
+    """ Loads a PNG-8 image from the "fname" file a band of rows at a time.
+        Yields the pairs (y, band): band is a PackedImage with the rows from
+        y on (band_height of them, the last band can have fewer rows).
+        The rows are decoded only when the band is requested, so only one
+        band of the image is in memory at a time.
+    """
+    with open(fname, mode='rb') as f:
+        reader = png.Reader(file=f)
+        try:
+            w, h, png_img, _ = reader.asRGB8()
+        except:
+            raise ValueError("WARNING: The image has a transparency channel.")
+        stride = 3 * w
+        data = bytearray()
+        y = 0
+        for line in png_img:
+            data += line
+            if len(data) == stride * band_height:
+                yield y, PackedImage(w, band_height, pack_rgb(data))
+                y += band_height
+                data = bytearray()
+        if data:
+            yield y, PackedImage(w, len(data) // stride, pack_rgb(data))
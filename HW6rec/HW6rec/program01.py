@@ -118,12 +118,16 @@ in which they can land, they cannot open all the hatches.
 [1] https://en.wikipedia.org/wiki/Zak_McKracken_and_the_Alien_Mindbenders)
 '''
 
-from pngmatrix import load_png8
+from pngmatrix import load_png8_packed, iter_png8_bands, unpack
 
 
-def ex(image_path, spacecraft_data, output_path):
-    # Load the city map image
-    city_map = load_png8(image_path)
+def ex(image_path, spacecraft_data, output_path, cache_dir=None):
+    # With a cache directory, the maps already seen are not decoded again
+    if cache_dir:
+        return ex_banded(image_path, spacecraft_data, output_path, cache_dir=cache_dir)
+
+    # Load the city map image, one 0xRRGGBB integer per pixel
+    city_map = load_png8_packed(image_path)
 
     # Detect and catalog buildings within the city map
     building_info = detect_buildings(city_map)
@@ -131,69 +135,221 @@ def ex(image_path, spacecraft_data, output_path):
     # Document detected buildings into a specified file
     document_buildings(building_info, output_path)
 
-    # Load spacecraft dimensions and requirements
-    spacecraft_specs = load_spacecraft_specs(spacecraft_data)
+    # Stream the spacecraft dimensions and requirements from the file
+    spacecraft_specs = iter_spacecraft_specs(spacecraft_data)
 
-    # Determine feasible landing zones for each spacecraft
-    landing_feasibility = assess_landing_zones(city_map, spacecraft_specs)
+    # Determine feasible landing zones for each spacecraft, as they are read
+    landing_feasibility = list(stream_landing_zones(city_map, spacecraft_specs))
 
     return landing_feasibility
 
 
-def detect_buildings(image):
-    buildings = []
-    img_height, img_width = len(image), len(image[0])
-    seen_pixels = [[False for _ in range(img_width)] for _ in range(img_height)]
+def ex_banded(image_path, spacecraft_data, output_path, band_height=256, cache_dir=None):
+    # As ex, for city maps too large to be kept in memory. The analysis of
+    # the map can be saved in (and reused from) the cache directory
+    if cache_dir:
+        from mapcache import analyse
+        buildings, rows, img_width, img_height = analyse(image_path, cache_dir, band_height)
+    else:
+        buildings, rows, img_width, img_height = scan_city(image_path, band_height)
+    document_buildings(buildings, output_path)
+    fits = lambda *craft: fits_bits(rows, img_width, img_height, *craft)
+    return list(stream_queries(iter_spacecraft_specs(spacecraft_data), fits, 4096))
 
-    for row in range(img_height):
-        for col in range(img_width):
-            if not seen_pixels[row][col] and image[row][col] != (0, 0, 0):
-                current_color = image[row][col]
-                width, height = 1, 1
 
-                # Expand to the right
-                while col + width < img_width and image[row][col + width] == current_color:
-                    width += 1
-                # Expand downwards
-                while row + height < img_height and all(
-                        image[row + height][col + offset] == current_color for offset in range(width)):
-                    height += 1
+def scan_city(image_path, band_height=256):
+    # Decode the map a band of rows at a time: only one band of pixels is in
+    # memory. The runs of the rows go to buildings_from_runs as they are
+    # decoded (the buildings still open at the end of a band continue in the
+    # next one), and the occupancy bits of the rows are kept for the landing.
+    # Returns the buildings, the occupancy bits, the width and the height
+    rows = []
+    size = [0, 0]
 
-                # Mark pixels as seen
-                for dy in range(height):
-                    for dx in range(width):
-                        seen_pixels[row + dy][col + dx] = True
+    def rows_of_runs():
+        for y, band in iter_png8_bands(image_path, band_height):
+            size[:] = band.width, y + band.height
+            rows.extend(occupancy_bits(band))
+            yield from encode_runs(band)
 
-                buildings.append((col, row, width, height, current_color[0], current_color[1], current_color[2]))
+    buildings = buildings_from_runs(rows_of_runs())
+    return buildings, rows, size[0], size[1]
 
-    return buildings
 
+def detect_buildings(image):
+    # Run-length encode every row, then stack the runs into rectangles,
+    # found in raster order of their top-left corners
+    return buildings_from_runs(encode_runs(image))
+
+
+def encode_runs(image):
+    # One list of (start, length, colour) runs of coloured pixels per row
+    pixels, img_width = image.pixels, image.width
+    return [row_runs(pixels, row * img_width, img_width) for row in range(image.height)]
+
+
+def row_runs(pixels, start, img_width):
+    runs = []
+    col = 0
+    while col < img_width:
+        color = pixels[start + col]
+        end = col + 1
+        while end < img_width and pixels[start + end] == color:
+            end += 1
+        if color != 0:
+            runs.append((col, end - col, color))
+        col = end
+    return runs
+
+
+def buildings_from_runs(rows_of_runs):
+    # A building is a stack of identical runs on consecutive rows: a run equal
+    # to one of the previous row makes its building one row taller, any
+    # other run is the top side of a new building
+    buildings = []
+    open_buildings = {}
+    for row, runs in enumerate(rows_of_runs):
+        still_open = {}
+        for run in runs:
+            building = open_buildings.get(run)
+            if building is None:
+                building = [run[0], row, run[1], 0, run[2]]
+                buildings.append(building)
+            building[3] += 1
+            still_open[run] = building
+        open_buildings = still_open
+
+    # The colour goes back to (r, g, b) only for the output
+    return [(x, y, w, h) + unpack(color) for x, y, w, h, color in buildings]
 
-def document_buildings(building_data, file_path):
-    # Sort buildings for output consistency
-    sorted_buildings = sorted(building_data, key=lambda b: (-b[1], b[0]))
 
+def document_buildings(building_data, file_path):
+    # The buildings are written by decreasing y and increasing x. Those of
+    # detect_buildings are in raster order, so the buildings of a row are
+    # consecutive (by increasing x): the rows are written from the last one,
+    # without sorting. Any other order is sorted first
+    starts = row_starts(building_data)
+    if starts is None:
+        building_data = sorted(building_data, key=lambda b: (b[1], b[0]))
+        starts = row_starts(building_data)
+    write_building_rows(building_data, starts, file_path)
+
+
+def row_starts(buildings):
+    # The indexes where the rows of the buildings start (plus the length),
+    # None if the buildings are not in raster order
+    starts = [0]
+    for i in range(1, len(buildings)):
+        (x0, y0), (x1, y1) = buildings[i - 1][:2], buildings[i][:2]
+        if y1 != y0:
+            starts.append(i)
+        if (y1, x1) < (y0, x0):
+            return None
+    starts.append(len(buildings))
+    return starts
+
+
+def write_building_rows(buildings, starts, file_path):
+    # buildings[starts[i]:starts[i + 1]] are the buildings of a row
     with open(file_path, 'w') as file:
-        for building in sorted_buildings:
-            file.write(','.join(map(str, building)) + '\n')
+        for i in range(len(starts) - 1, 0, -1):
+            file.write(''.join(','.join(map(str, building)) + '\n'
+                               for building in buildings[starts[i - 1]:starts[i]]))
 
 
 def load_spacecraft_specs(file_path):
-    spacecraft_list = []
-    with open(file_path, 'r') as file:
-        data = file.read().split()
+    return list(iter_spacecraft_specs(file_path))
 
-    # Convert data to integer triples
-    specs = [int(value) for value in data if value.isdigit()]
 
-    for i in range(0, len(specs), 3):
-        if i + 2 < len(specs):
-            spacecraft_list.append((specs[i], specs[i + 1], specs[i + 2]))
-
-    return spacecraft_list
+def iter_spacecraft_specs(file_path, chunk_size=1 << 16):
+    # Yields the (W, H, D) triples of the file while reading it in chunks:
+    # the tokens are separated by any whitespace, the ones that are not
+    # numbers are skipped and the last incomplete triple is dropped
+    triple = []
+    with open(file_path, 'r') as file:
+        tail = ''
+        while True:
+            chunk = file.read(chunk_size)
+            tokens = (tail + chunk).split()
+            # the last token could continue in the next chunk
+            tail = tokens.pop() if tokens and chunk and not chunk[-1].isspace() else ''
+            for value in tokens:
+                if value.isdigit():
+                    triple.append(int(value))
+                    if len(triple) == 3:
+                        yield tuple(triple)
+                        triple = []
+            if not chunk:
+                break
+
+
+def stream_landing_zones(image, spacecrafts, method='sat', chunk=4096):
+    # Lazily evaluate the spacecrafts (any iterable, e.g. the triples of
+    # iter_spacecraft_specs) "chunk" at a time with one of the LANDING_CHECKERS
+    return stream_queries(spacecrafts, LANDING_CHECKERS[method](image), chunk)
+
+
+def assess_landing_zones(image, spacecrafts, method='sat', workers=None):
+    # Evaluate every spacecraft with one of the LANDING_METHODS,
+    # in a pool of processes if some workers are requested
+    if workers:
+        from parallel import assess_parallel
+        return assess_parallel(image, spacecrafts, method, workers)
+    return LANDING_METHODS[method](image, spacecrafts)
+
+
+def assess_queries(spacecrafts, fits):
+    return list(stream_queries(spacecrafts, fits))
+
+
+def stream_queries(spacecrafts, fits, chunk=None):
+    # Yields the answers of the spacecrafts (any iterable) in their order,
+    # taking them "chunk" at a time (all at once if chunk is None)
+    landed, failed = [], []
+    spacecrafts = iter(spacecrafts)
+    while True:
+        batch = []
+        for craft in spacecrafts:
+            batch.append(craft)
+            if len(batch) == chunk:
+                break
+        if not batch:
+            return
+        yield from assess_batch(batch, fits, landed, failed)
+
+
+def assess_batch(spacecrafts, fits, landed, failed):
+    # Every distinct spacecraft is checked at most once with fits(W, H, D).
+    # A spacecraft no larger (in W, H and D) than one that lands lands too,
+    # one no smaller than a spacecraft that does not land does not land either:
+    # the ones checked so far are kept in "landed" and "failed".
+    # Sorted by area, they are visited as in a binary search (the middle one,
+    # then the middles of the two halves, ...) so that both the answers True
+    # and False settle many of the others.
+    # Any 3-sequence is accepted, as tuple it can be a dict key
+    spacecrafts = [tuple(craft) for craft in spacecrafts]
+    queue = sorted(set(spacecrafts), key=lambda c: (c[0] * c[1] + 2 * c[2] * (c[0] + c[1]), c))
+    order, ranges = [], [(0, len(queue))]
+    for lo, hi in ranges:
+        if lo < hi:
+            mid = (lo + hi) // 2
+            order.append(queue[mid])
+            ranges += [(lo, mid), (mid + 1, hi)]
+    answers = {}
+    for craft in order:
+        width, height, hatch = craft
+        if any(width <= w and height <= h and hatch <= d for w, h, d in landed):
+            answers[craft] = True
+        elif any(width >= w and height >= h and hatch >= d for w, h, d in failed):
+            answers[craft] = False
+        else:
+            answers[craft] = fits(*craft)
+            (landed if answers[craft] else failed).append(craft)
+    return [answers[craft] for craft in spacecrafts]
 
 
-def assess_landing_zones(image, spacecrafts):
+def assess_by_scan(image, spacecrafts):
+    # Check every position pixel by pixel against the landing matrix
     possible_landings = []
     for craft in spacecrafts:
         craft_width, craft_height, hatch_extension = craft
@@ -201,8 +357,8 @@ def assess_landing_zones(image, spacecrafts):
         extended_width = craft_width + 2 * hatch_extension
         extended_height = craft_height + 2 * hatch_extension
 
-        for row in range(len(image) - extended_height + 1):
-            for col in range(len(image[0]) - extended_width + 1):
+        for row in range(image.height - extended_height + 1):
+            for col in range(image.width - extended_width + 1):
                 if check_landing_space(image, col, row, craft_width, craft_height, hatch_extension, landing_matrix):
                     possible_landings.append(True)
                     break
@@ -223,15 +379,289 @@ def create_landing_matrix(height, width, extension):
 
 
 def check_landing_space(image, x, y, width, height, extension, matrix):
-    img_height, img_width = len(image), len(image[0])
+    # A pixel is free when its packed colour is 0 (black)
+    pixels, img_width = image.pixels, image.width
     for dy in range(y, y + height + 2 * extension):
+        start = dy * img_width
         for dx in range(x, x + width + 2 * extension):
-            if image[dy][dx] != (0, 0, 0) and matrix[dy - y][dx - x] != " ":
+            if pixels[start + dx] != 0 and matrix[dy - y][dx - x] != " ":
                 return False
     return True
 
 
-if __name__ == "__main__":
-    print(ex("HW6rec/images/image9.png", "HW6rec/rectangles/rectangles9.txt", "output.txt"))
+def occupancy_table(image):
+    # Summed-area table of the coloured pixels: table[y * (width + 1) + x] is
+    # the number of coloured pixels in the rows < y and columns < x
+    pixels, img_width, img_height = image.pixels, image.width, image.height
+    stride = img_width + 1
+    table = [0] * (stride * (img_height + 1))
+    for row in range(img_height):
+        above, here, start = row * stride + 1, (row + 1) * stride + 1, row * img_width
+        line = 0
+        for col in range(img_width):
+            if pixels[start + col]:
+                line += 1
+            table[here + col] = table[above + col] + line
+    return table
+
+
+def assess_by_sat(image, spacecrafts):
+    return assess_queries(spacecrafts, sat_checker(image))
+
+
+def sat_checker(image):
+    # The summed-area table is built once per map, then each position costs
+    # two rectangle sums: the horizontal (W+2D)xH and the vertical Wx(H+2D)
+    # bars of the cross must both contain no coloured pixel
+    table = occupancy_table(image)
+    return lambda *craft: fits_sat(table, image.width, image.height, *craft)
+
+
+def fits_sat(table, img_width, img_height, craft_width, craft_height, hatch_extension):
+    stride = img_width + 1
+    extended_width = craft_width + 2 * hatch_extension
+    extended_height = craft_height + 2 * hatch_extension
+    for row in range(img_height - extended_height + 1):
+        top, bottom = row * stride, (row + extended_height) * stride
+        core_top = (row + hatch_extension) * stride
+        core_bottom = (row + hatch_extension + craft_height) * stride
+        for col in range(img_width - extended_width + 1):
+            left, right = col, col + extended_width
+            if table[core_bottom + right] - table[core_top + right] - table[core_bottom + left] + table[core_top + left]:
+                continue
+            left, right = col + hatch_extension, col + hatch_extension + craft_width
+            if table[bottom + right] - table[top + right] - table[bottom + left] + table[top + left]:
+                continue
+            return True
+    return False
+
+
+def empty_rectangles(image):
+    # All the maximal empty (black) rectangles (x0, y0, x1, y1) of the map,
+    # x1 and y1 excluded. Every row is the base of a histogram of the black
+    # pixels above it: a stack finds the rectangles that cannot grow left,
+    # right or up, they are kept if the next row stops them from growing down
+    pixels, img_width, img_height = image.pixels, image.width, image.height
+    heights = [0] * (img_width + 1)
+    rectangles = []
+    for row in range(img_height):
+        start = row * img_width
+        for col in range(img_width):
+            heights[col] = 0 if pixels[start + col] else heights[col] + 1
+        # coloured pixels of the next row, as prefix counts
+        below = None
+        if row + 1 < img_height:
+            below = [0] * (img_width + 1)
+            start += img_width
+            for col in range(img_width):
+                below[col + 1] = below[col] + (pixels[start + col] != 0)
+        stack = []
+        for col in range(img_width + 1):
+            height = heights[col]
+            left = col
+            while stack and stack[-1][1] >= height:
+                left, top = stack.pop()
+                if top > height and (below is None or below[col] != below[left]):
+                    rectangles.append((left, row - top + 1, col, row + 1))
+            if height and (not stack or stack[-1][1] < height):
+                stack.append((left, height))
+    return rectangles
+
+
+def assess_by_mer(image, spacecrafts):
+    return assess_queries(spacecrafts, mer_checker(image))
+
+
+def mer_checker(image):
+    # The maximal empty rectangles are found once per map, then each
+    # spacecraft only checks them instead of scanning the image again
+    rectangles = empty_rectangles(image)
+    return lambda *craft: fits_mer(rectangles, image.width, image.height, *craft)
+
+
+def fits_mer(rectangles, img_width, img_height, craft_width, craft_height, hatch_extension):
+    extended_width = craft_width + 2 * hatch_extension
+    extended_height = craft_height + 2 * hatch_extension
+    if extended_width > img_width or extended_height > img_height:
+        return False
+    # The two bars of the cross, as (x, y, width, height) inside the bounding box
+    bars = [(0, hatch_extension, extended_width, craft_height),
+            (hatch_extension, 0, craft_width, extended_height)]
+    bars = [bar for bar in bars if bar[2] and bar[3]]
+    if not bars:
+        return True
+    # For every bar and every empty rectangle that can hold it, the positions
+    # (x0, x1, y0, y1) of the bounding box that keep the bar inside it
+    positions = []
+    for x, y, width, height in bars:
+        boxes = []
+        for x0, y0, x1, y1 in rectangles:
+            if x1 - x0 >= width and y1 - y0 >= height:
+                box = (max(0, x0 - x), min(img_width - extended_width, x1 - x - width),
+                       max(0, y0 - y), min(img_height - extended_height, y1 - y - height))
+                if box[0] <= box[1] and box[2] <= box[3]:
+                    boxes.append(box)
+        if not boxes:
+            return False
+        positions.append(boxes)
+    if len(positions) == 1:
+        return True
+    # The cross lands if two rectangles share a position of the bounding box
+    for ax0, ax1, ay0, ay1 in positions[0]:
+        for bx0, bx1, by0, by1 in positions[1]:
+            if ax0 <= bx1 and bx0 <= ax1 and ay0 <= by1 and by0 <= ay1:
+                return True
+    return False
+
+
+def free_runs(image):
+    # For every pixel, how many black pixels start from it going right and
+    # going down (0 on the buildings). The runs going left and up are not
+    # needed: the crosses are checked from their top-left corner
+    pixels, img_width, img_height = image.pixels, image.width, image.height
+    right = [0] * (img_width * img_height)
+    down = [0] * (img_width * (img_height + 1))
+    for row in range(img_height - 1, -1, -1):
+        start = row * img_width
+        run = 0
+        for i in range(start + img_width - 1, start - 1, -1):
+            if pixels[i]:
+                run = 0
+            else:
+                run += 1
+                right[i] = run
+                down[i] = down[i + img_width] + 1
+    return right, down
+
+
+def assess_by_runs(image, spacecrafts):
+    return assess_queries(spacecrafts, runs_checker(image))
+
+
+def runs_checker(image):
+    runs = free_runs(image)
+    return lambda *craft: fits_runs(runs, image.width, image.height, *craft)
+
+
+def fits_runs(runs, img_width, img_height, craft_width, craft_height, hatch_extension):
+    right, down = runs
+    extended_width = craft_width + 2 * hatch_extension
+    extended_height = craft_height + 2 * hatch_extension
+    if extended_width > img_width or extended_height > img_height:
+        return False
+    # the horizontal bar, if not empty, must be free on all its rows...
+    check_a = craft_height > 0 and extended_width > 0
+    # ...and the vertical bar on all its columns
+    check_b = craft_width > 0 and extended_height > 0
+    if not check_a and not check_b:
+        return True
+    # rows in a column, up to the current one, with room for the horizontal bar
+    columns = [0] * img_width
+    for row in range(img_height):
+        top = row
+        if check_a:
+            start = row * img_width
+            for x in range(img_width):
+                columns[x] = columns[x] + 1 if right[start + x] >= extended_width else 0
+            # the horizontal bar ends on this row
+            top = row - hatch_extension - craft_height + 1
+        if top < 0:
+            continue
+        if top > img_height - extended_height:
+            break
+        if not check_b:
+            for left in range(img_width - extended_width + 1):
+                if columns[left] >= craft_height:
+                    return True
+            continue
+        # columns in the top row, up to x, with room for the vertical bar
+        start = top * img_width
+        run = 0
+        for x in range(img_width):
+            run = run + 1 if down[start + x] >= extended_height else 0
+            # the vertical bar ends on column x
+            left = x - hatch_extension - craft_width + 1
+            if run >= craft_width and 0 <= left <= img_width - extended_width and \
+                    (not check_a or columns[left] >= craft_height):
+                return True
+    return False
+
+
+def occupancy_bits(image):
+    # One integer per row, with the bit x set if the pixel (x, row) is coloured
+    pixels, img_width = image.pixels, image.width
+    rows = []
+    for start in range(0, img_width * image.height, img_width):
+        bits = ''.join('1' if c else '0' for c in reversed(pixels[start:start + img_width]))
+        rows.append(int(bits or '0', 2))
+    return rows
+
+
+def assess_by_bits(image, spacecrafts):
+    return assess_queries(spacecrafts, bits_checker(image))
+
+
+def bits_checker(image):
+    # All the positions of a row of the bounding box are checked together:
+    # the rows covered by each bar are OR-ed in a mask, its runs of free bits
+    # are found with shifts and ANDs and the two bars must agree on a position
+    rows = occupancy_bits(image)
+    return lambda *craft: fits_bits(rows, image.width, image.height, *craft)
+
+
+def free_starts(free, length):
+    # The bits x of "free" followed by length-1 set bits (all of them if length is 0)
+    if length == 0:
+        return -1
+    have = 1
+    while have < length:
+        step = min(have, length - have)
+        free &= free >> step
+        have += step
+    return free
+
+
+def fits_bits(rows, img_width, img_height, craft_width, craft_height, hatch_extension):
+    extended_width = craft_width + 2 * hatch_extension
+    extended_height = craft_height + 2 * hatch_extension
+    if extended_width > img_width or extended_height > img_height:
+        return False
+    full = (1 << img_width) - 1
+    anchors = (1 << (img_width - extended_width + 1)) - 1
+    for top in range(img_height - extended_height + 1):
+        # the horizontal bar covers the middle rows, the vertical one all of them
+        middle = top + hatch_extension
+        mask_a = 0
+        for row in rows[middle:middle + craft_height]:
+            mask_a |= row
+        mask_b = mask_a
+        for row in rows[top:middle]:
+            mask_b |= row
+        for row in rows[middle + craft_height:top + extended_height]:
+            mask_b |= row
+        if anchors & free_starts(full & ~mask_a, extended_width) \
+                & (free_starts(full & ~mask_b, craft_width) >> hatch_extension):
+            return True
+    return False
+
+
+LANDING_METHODS = {
+    'scan': assess_by_scan,
+    'sat':  assess_by_sat,
+    'mer':  assess_by_mer,
+    'runs': assess_by_runs,
+    'bits': assess_by_bits,
+}
+
+# The methods that can answer the spacecrafts one at a time:
+# checker(image) returns the function fits(W, H, D)
+LANDING_CHECKERS = {
+    'sat':  sat_checker,
+    'mer':  mer_checker,
+    'runs': runs_checker,
+    'bits': bits_checker,
+}
 
 
+if __name__ == "__main__":
+    print(ex("HW6rec/images/image9.png", "HW6rec/rectangles/rectangles9.txt", "output.txt"))
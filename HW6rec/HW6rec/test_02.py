@@ -0,0 +1,261 @@
+import testlib, random, os, tempfile
+from ddt import ddt, data
+
+import pngmatrix
+import program01
+import parallel
+import batch
+import mapcache
+import citygen
+import bench
+
+IMAGES = ['example'] + [str(i) for i in range(11)]
+
+
+def image_file(id_file):
+    return 'images/' + ('example' if id_file == 'example' else 'image' + id_file) + '.png'
+
+
+def rectangles_file(id_file):
+    return 'rectangles/' + ('example' if id_file == 'example' else 'rectangles' + id_file) + '.txt'
+
+
+def spacecrafts(id_file, n=25, seed=0):
+    # the spaceships of the rectangles file plus some random ones (with zeros)
+    crafts = program01.load_spacecraft_specs(rectangles_file(id_file))
+    rnd = random.Random(seed)
+    crafts += [(rnd.randint(0, 12), rnd.randint(0, 12), rnd.randint(0, 6)) for _ in range(n)]
+    return crafts
+
+
+def expected_buildings(id_file):
+    name = 'expected/' + ('example' if id_file == 'example' else 'image' + id_file) + '.txt'
+    with open(name) as f:
+        return [tuple(map(int, line.split(','))) for line in f if line.strip()]
+
+
+@ddt
+class Test(testlib.TestCase):
+
+    ############# FLAT IMAGES ###########
+    @data(*IMAGES)
+    def test_load_png8_flat(self, id_file):
+        matrix = pngmatrix.load_png8(image_file(id_file))
+        image = pngmatrix.load_png8_flat(image_file(id_file))
+        self.assertEqual((image.width, image.height), (len(matrix[0]), len(matrix)))
+        self.assertEqual(len(image.data), 3 * image.width * image.height)
+        self.assertEqual(image.to_matrix(), matrix)
+        y, x = image.height // 2, image.width // 2
+        self.assertEqual(image.pixel(x, y), matrix[y][x])
+        self.assertEqual(bytes(image[y][3 * x:3 * x + 3]), bytes(matrix[y][x]))
+        self.assertEqual(len(image.rows(1, 3)), 2 * image.stride)
+
+    ############# PACKED IMAGES ###########
+    @data(*IMAGES)
+    def test_load_png8_packed(self, id_file):
+        matrix = pngmatrix.load_png8(image_file(id_file))
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        self.assertEqual(image.pixels.typecode, 'I')
+        self.assertEqual(image.to_matrix(), matrix)
+        self.assertEqual(pngmatrix.pack_matrix(matrix).pixels, image.pixels)
+        for row in matrix:
+            for c in row:
+                self.assertEqual(pngmatrix.unpack(pngmatrix.pack(*c)), c)
+
+    ############# DETECTION ###########
+    @data(*IMAGES)
+    def test_detect_buildings(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        buildings = program01.detect_buildings(image)
+        self.assertEqual(sorted(buildings, key=lambda b: (-b[1], b[0])), expected_buildings(id_file))
+        runs = program01.encode_runs(image)
+        self.assertEqual(sum(len(r) for r in runs), sum(b[3] for b in buildings))
+        self.assertEqual(buildings, sorted(buildings, key=lambda b: (b[1], b[0])))
+
+    @data('example', '0', '10')
+    def test_document_buildings(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        buildings = program01.detect_buildings(image)
+        shuffled = buildings[:]
+        random.Random(0).shuffle(shuffled)
+        os.makedirs('test_output', exist_ok=True)
+        fileout = 'test_output/buildings' + id_file + '.txt'
+        for data in (buildings, shuffled):
+            program01.document_buildings(data, fileout)
+            with open(fileout) as f:
+                lines = [tuple(map(int, line.split(','))) for line in f]
+            self.assertEqual(lines, expected_buildings(id_file))
+        os.remove(fileout)
+
+    ############# LANDING ###########
+    @data(*IMAGES)
+    def test_landing_methods(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        crafts = spacecrafts(id_file)
+        expected = program01.assess_landing_zones(image, crafts, 'scan')
+        for method in program01.LANDING_METHODS:
+            with self.subTest(method=method):
+                self.assertEqual(program01.assess_landing_zones(image, crafts, method), expected)
+                # the spacecrafts can also be lists
+                self.assertEqual(program01.assess_landing_zones(image, [list(c) for c in crafts], method), expected)
+
+    def test_assess_queries(self):
+        checked = []
+
+        def fits(w, h, d):
+            checked.append((w, h, d))
+            return w * h + 2 * d * (w + h) <= 20
+        crafts = [(2, 2, 1), (5, 5, 0), (1, 1, 1), (2, 2, 1), (6, 6, 1), (4, 1, 1), (1, 2, 0)]
+        self.assertEqual(program01.assess_queries(crafts, fits), [True, False, True, True, False, True, True])
+        # the duplicate and the dominated spacecrafts are never checked
+        self.assertEqual(len(set(checked)), len(checked))
+        self.assertNotIn((1, 1, 1), checked)
+        # on a chain of spacecrafts it is a binary search
+        checked.clear()
+        crafts = [(k, k, 0) for k in range(16, 0, -1)]
+        self.assertEqual(program01.assess_queries(crafts, fits), [k * k <= 20 for k in range(16, 0, -1)])
+        self.assertLessEqual(len(checked), 5)
+
+    @data(*IMAGES)
+    def test_stream_specs(self, id_file):
+        name = rectangles_file(id_file)
+        with open(name) as f:
+            values = [int(v) for v in f.read().split() if v.isdigit()]
+        expected = [tuple(values[i:i + 3]) for i in range(0, len(values) - 2, 3)]
+        self.assertEqual(program01.load_spacecraft_specs(name), expected)
+        for chunk_size in (1, 2, 7):
+            self.assertEqual(list(program01.iter_spacecraft_specs(name, chunk_size)), expected)
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        crafts = spacecrafts(id_file)
+        answers = program01.stream_landing_zones(image, iter(crafts), 'runs', chunk=5)
+        self.assertEqual(list(answers), program01.assess_landing_zones(image, crafts, 'scan'))
+
+    @data(*IMAGES)
+    def test_occupancy_bits(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        rows = program01.occupancy_bits(image)
+        self.assertEqual(len(rows), image.height)
+        for y, row in enumerate(rows):
+            self.assertEqual([row >> x & 1 for x in range(image.width)], [int(c != 0) for c in image[y]])
+        self.assertEqual(program01.free_starts(0b0111011110, 3), 0b0001000110)
+
+    @data(*IMAGES)
+    def test_banded(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        for band_height in (1, 7, 1000):
+            bands = list(pngmatrix.iter_png8_bands(image_file(id_file), band_height))
+            self.assertTrue(all(band.height <= band_height for _, band in bands))
+            self.assertEqual(b''.join(band.pixels.tobytes() for _, band in bands), image.pixels.tobytes())
+            buildings, rows, w, h = program01.scan_city(image_file(id_file), band_height)
+            self.assertEqual(buildings, program01.detect_buildings(image))
+            self.assertEqual((rows, w, h), (program01.occupancy_bits(image), image.width, image.height))
+        os.makedirs('test_output', exist_ok=True)
+        fileout = 'test_output/banded' + id_file + '.txt'
+        rectangles = rectangles_file(id_file)
+        self.assertEqual(program01.ex_banded(image_file(id_file), rectangles, fileout, 5),
+                         program01.assess_landing_zones(image, program01.load_spacecraft_specs(rectangles), 'scan'))
+        with open(fileout) as f:
+            self.assertEqual([tuple(map(int, line.split(','))) for line in f], expected_buildings(id_file))
+        os.remove(fileout)
+
+    def test_mapcache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fileout = os.path.join(tmp, 'out.txt')
+            for id_file in IMAGES:
+                rectangles = rectangles_file(id_file)
+                expected = program01.ex(image_file(id_file), rectangles, fileout)
+                digest = mapcache.content_hash(image_file(id_file))
+                for _ in range(2):
+                    self.assertEqual(program01.ex(image_file(id_file), rectangles, fileout, cache_dir=tmp), expected)
+                    with open(fileout) as f:
+                        self.assertEqual([tuple(map(int, line.split(','))) for line in f], expected_buildings(id_file))
+                    self.assertTrue(os.path.exists(os.path.join(tmp, digest + '.json')))
+            # the second time the map is not decoded
+            scan_city, program01.scan_city = program01.scan_city, None
+            try:
+                self.assertEqual(mapcache.analyse(image_file('3'), tmp)[0], program01.detect_buildings(
+                    pngmatrix.load_png8_packed(image_file('3'))))
+            finally:
+                program01.scan_city = scan_city
+
+    @data(64, 100)
+    def test_citygen(self, size):
+        with tempfile.TemporaryDirectory() as tmp:
+            city = citygen.generate_city(size, size // 2, 60, max_side=10, seed=size)
+            png_file = os.path.join(tmp, 'city.png')
+            citygen.save_city(png_file, size, size // 2, city)
+            image = pngmatrix.load_png8_packed(png_file)
+            self.assertEqual((image.width, image.height), (size, size // 2))
+            self.assertEqual(sorted(program01.detect_buildings(image)),
+                             sorted((x, y, w, h) + colour for x, y, w, h, colour in city))
+            crafts = citygen.random_spacecrafts(30, 12, seed=size)
+            specs_file = os.path.join(tmp, 'city.txt')
+            citygen.save_spacecrafts(specs_file, crafts)
+            self.assertEqual(program01.load_spacecraft_specs(specs_file), crafts)
+            rows = list(bench.benchmark([32], ['scan', 'bits'], 10, tmp))
+            self.assertEqual([phase for _, phase, _, _, _ in rows],
+                             ['load', 'detect', 'write', 'banded', 'landing scan', 'landing bits'])
+            self.assertEqual(rows[-1][4], rows[-2][4])
+
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = batch.example_manifest(tmp) + [('images/missing.png', 'rectangles/example.txt',
+                                                   os.path.join(tmp, 'missing.txt'))]
+            manifest = os.path.join(tmp, 'manifest.txt')
+            with open(manifest, 'w') as f:
+                f.write('# image specs output\n\n' + ''.join('\t'.join(job) + '\n' for job in jobs))
+            self.assertEqual(batch.read_manifest(manifest), jobs)
+            results, summary = batch.run_batch(jobs, workers=2)
+            self.assertEqual((summary['maps'], summary['failures']), (len(jobs), 1))
+            self.assertIn('FileNotFoundError', results[-1]['error'])
+            for id_file, result in zip(IMAGES, results):
+                self.assertIsNone(result['error'])
+                self.assertEqual(result['buildings'], len(expected_buildings(id_file)))
+                with open(result['output']) as f:
+                    self.assertEqual([tuple(map(int, line.split(','))) for line in f], expected_buildings(id_file))
+
+    @data('example', '3', '10')
+    def test_parallel(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        crafts = spacecrafts(id_file)
+        expected = program01.assess_landing_zones(image, crafts, 'scan')
+        self.assertEqual(program01.assess_landing_zones(image, crafts, 'sat', workers=2), expected)
+        self.assertEqual(parallel.assess_parallel(image, crafts, 'runs', workers=2, chunks=7), expected)
+        self.assertEqual(parallel.assess_parallel(image, [], workers=2), [])
+        self.assertEqual([len(s) for s in parallel.split(list(range(10)), 4)], [3, 3, 2, 2])
+
+    @data(*IMAGES)
+    def test_empty_rectangles(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        w, h, pixels = image.width, image.height, image.pixels
+
+        def empty(x0, y0, x1, y1):
+            return 0 <= x0 < x1 <= w and 0 <= y0 < y1 <= h and \
+                not any(pixels[y * w + x] for y in range(y0, y1) for x in range(x0, x1))
+        rectangles = program01.empty_rectangles(image)
+        self.assertEqual(len(set(rectangles)), len(rectangles))
+        for x0, y0, x1, y1 in rectangles:
+            self.assertTrue(empty(x0, y0, x1, y1))
+            # none of them can grow in any direction
+            self.assertFalse(empty(x0 - 1, y0, x1, y1) or empty(x0, y0 - 1, x1, y1)
+                             or empty(x0, y0, x1 + 1, y1) or empty(x0, y0, x1, y1 + 1))
+
+    @data(*IMAGES)
+    def test_free_runs(self, id_file):
+        image = pngmatrix.load_png8_packed(image_file(id_file))
+        w, h, pixels = image.width, image.height, image.pixels
+        right, down = program01.free_runs(image)
+        rnd = random.Random(id_file)
+        for _ in range(200):
+            x, y = rnd.randrange(w), rnd.randrange(h)
+            r = 0
+            while x + r < w and not pixels[y * w + x + r]:
+                r += 1
+            d = 0
+            while y + d < h and not pixels[(y + d) * w + x]:
+                d += 1
+            self.assertEqual((right[y * w + x], down[y * w + x]), (r, d))
+
+
+if __name__ == '__main__':
+    Test.main()